@@ -0,0 +1,355 @@
+"""
+End-to-end benchmark of the ingest and rag services, offline on one machine.
+
+The real ingest and rag apps are loaded in-process and served by uvicorn on
+localhost; Chroma, embed and the LLM are replaced by the stand-ins in
+standins.py, with --embed-replicas / --llm-replicas copies of the last two
+behind EMBEDDING_URLS / LLM_URLS. Scenarios:
+
+  ingest   upload synthetic CSV and XLSX exports, rows/sec of the ingest job
+  search   /search latency p50/p95/p99 and throughput at each --concurrency, then
+           for each --rank-modes at the first concurrency level
+  stream   /search-stream time to first token and total time with use_ai
+  burst    the same use_ai stream opened --burst times at once (coalesced in rag)
+
+    python bench/run.py
+    python bench/run.py --rows 50000 --concurrency 1 8 32 --requests 400
+    python bench/run.py --compare bench/results/<earlier>.json --max-regression 15
+
+Results (git commit, config, scenario numbers and the services' per-stage
+timings from /metrics) are written as JSON to --out. Everything shares one
+process, so absolute numbers understate a real deployment; compare runs made
+on the same machine.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+import standins
+import synthetic
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICES = ROOT / "services"
+
+
+def install_stand_ins():
+    standins.FakeChroma.install()
+
+
+def _purge_service_modules():
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if path.startswith(str(SERVICES)):
+            del sys.modules[name]
+
+
+def load_service(name: str):
+    """
+    Import services/<name>/main.py. The services share module names (main,
+    helpers), so each is imported with its own directory on sys.path and then
+    dropped from sys.modules; the loaded app keeps its own module objects.
+    """
+    _purge_service_modules()
+    paths = [str(SERVICES / name), str(SERVICES / "common")]
+    sys.path[:0] = paths
+    try:
+        return importlib.import_module("main")
+    finally:
+        del sys.path[:len(paths)]
+        _purge_service_modules()
+
+
+def wait_for(predicate, timeout: float = 60.0, interval: float = 0.1):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("timed out waiting for the service")
+        time.sleep(interval)
+
+
+def percentiles(latencies_ms: list) -> dict:
+    if not latencies_ms:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    values = np.asarray(latencies_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+    }
+
+
+# --- scenarios ---
+
+def run_ingest(ingest_url: str, name: str, filename: str, content: bytes, mime: str) -> dict:
+    with httpx.Client(base_url=ingest_url, timeout=120) as client:
+        started = time.perf_counter()
+        resp = client.post("/add-file", files={"file": (filename, content, mime)})
+        resp.raise_for_status()
+        job_id = resp.json()[0]["job"]["id"]
+        job = {}
+
+        def finished():
+            job.update(client.get(f"/jobs/{job_id}").json())
+            return job["status"] not in ("queued", "running")
+
+        wait_for(finished, timeout=3600, interval=0.05)
+        wall = time.perf_counter() - started
+    result = {
+        "status": job["status"],
+        "rows": job["counts"]["rows"],
+        "counts": job["counts"],
+        "job_seconds": job["seconds"],
+        "wall_seconds": round(wall, 3),
+        "rows_per_sec": job["rows_per_sec"],
+        "wall_rows_per_sec": round(job["counts"]["rows"] / wall, 1) if wall else None,
+        "upload_bytes": len(content),
+        "errors": job["errors"],
+    }
+    print(f"ingest {name:<5} {result['rows']} rows in {result['wall_seconds']}s "
+          f"({result['rows_per_sec']} rows/sec in the job, {result['status']})")
+    return result
+
+
+async def run_search(rag_url: str, queries: list, concurrency: int, n_results: int, rank_mode: str = "hybrid") -> dict:
+    latencies, errors = [], 0
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=rag_url, timeout=60, limits=limits) as client:
+        async def one(q: str):
+            nonlocal errors
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    resp = await client.post("/search", json={"query": q, "use_ai": False, "n_results": n_results,
+                                                              "rank_mode": rank_mode})
+                    resp.raise_for_status()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                except Exception:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        wall = time.perf_counter() - started
+    result = {"requests": len(queries), "errors": errors, "concurrency": concurrency,
+              "rps": round(len(latencies) / wall, 1), **percentiles(latencies)}
+    print(f"search {rank_mode} c={concurrency:<3} p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+          f"p99 {result['p99_ms']} ms, {result['rps']} req/s, {errors} errors")
+    return result
+
+
+async def run_stream(rag_url: str, queries: list, concurrency: int, n_results: int) -> dict:
+    ttfts, totals, errors = [], [], 0
+    slots = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=rag_url, timeout=120) as client:
+        async def one(q: str):
+            nonlocal errors
+            async with slots:
+                started = time.perf_counter()
+                first_token = None
+                try:
+                    body = {"query": q, "use_ai": True, "n_results": n_results}
+                    async with client.stream("POST", "/search-stream", json=body) as resp:
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if line == "event: token" and first_token is None:
+                                first_token = time.perf_counter()
+                            elif line == "event: error":
+                                raise RuntimeError("error event")
+                            elif line == "event: done":
+                                break
+                    if first_token is None:
+                        raise RuntimeError("no tokens streamed")
+                    ttfts.append((first_token - started) * 1000)
+                    totals.append((time.perf_counter() - started) * 1000)
+                except Exception:
+                    errors += 1
+
+        await asyncio.gather(*(one(q) for q in queries))
+    result = {
+        "requests": len(queries), "errors": errors, "concurrency": concurrency,
+        "ttft": percentiles(ttfts), "total": percentiles(totals),
+    }
+    print(f"stream c={concurrency:<3} ttft p50 {result['ttft']['p50_ms']} ms / p95 {result['ttft']['p95_ms']} ms, "
+          f"total p50 {result['total']['p50_ms']} ms, {errors} errors")
+    return result
+
+
+def scrape_stages(url: str) -> dict:
+    """Mean time per pipeline stage from a service's /metrics."""
+    text = httpx.get(f"{url}/metrics", timeout=10).text
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(text):
+        if family.name != "stage_duration_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_sum"):
+                sums[sample.labels["stage"]] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[sample.labels["stage"]] = sample.value
+    return {
+        name: {"count": int(counts[name]), "mean_ms": round(sums[name] / counts[name] * 1000, 3)}
+        for name in sorted(counts) if counts[name]
+    }
+
+
+# --- results ---
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "services", "bench"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    out = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = value
+    return out
+
+
+def compare(previous: dict, current: dict, max_regression: float) -> bool:
+    """Print latency/throughput changes; False if any got worse by more than max_regression percent."""
+    old = flatten({k: previous.get(k, {}) for k in ("ingest", "search", "stream")})
+    new = flatten({k: current.get(k, {}) for k in ("ingest", "search", "stream")})
+    ok = True
+    print(f"\ncompared with {previous.get('git_commit')} ({previous.get('created_at')})")
+    for key in sorted(set(old) & set(new)):
+        higher_is_better = key.endswith(("rows_per_sec", "rps"))
+        if not (higher_is_better or key.endswith("_ms")) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > max_regression:
+            flag, ok = "  REGRESSION", False
+        print(f"  {key:<40} {old[key]:>10} -> {new[key]:>10}  {change:+6.1f}%{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="listings per uploaded file")
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"], choices=["csv", "xlsx"])
+    parser.add_argument("--requests", type=int, default=300, help="/search requests per concurrency level")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--rank-modes", nargs="+", default=["weighted", "cross-encoder"],
+                        choices=["weighted", "cross-encoder"])
+    parser.add_argument("--stream-requests", type=int, default=40)
+    parser.add_argument("--stream-concurrency", type=int, default=4)
+    parser.add_argument("--burst", type=int, default=16, help="identical concurrent streams in the burst scenario")
+    parser.add_argument("--embed-latency-ms", type=float, default=2.0)
+    parser.add_argument("--llm-ttft-ms", type=float, default=50.0)
+    parser.add_argument("--llm-token-ms", type=float, default=5.0)
+    parser.add_argument("--llm-tokens", type=int, default=64)
+    parser.add_argument("--embed-replicas", type=int, default=2, help="embed stand-ins behind EMBEDDING_URLS")
+    parser.add_argument("--llm-replicas", type=int, default=2, help="llm stand-ins behind LLM_URLS")
+    parser.add_argument("--out", default=str(ROOT / "bench" / "results"))
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="exit non-zero if --compare finds a metric this many percent worse")
+    args = parser.parse_args()
+
+    install_stand_ins()
+    standins.FakeChroma.HttpClient().get_or_create_collection("job_listings")
+    embeds = [standins.serve(standins.embed_app(latency_ms=args.embed_latency_ms)) for _ in range(args.embed_replicas)]
+    llms = [standins.serve(standins.llm_app(args.llm_ttft_ms, args.llm_token_ms, args.llm_tokens))
+            for _ in range(args.llm_replicas)]
+
+    os.environ.update({
+        "HF_HUB_OFFLINE": "1",  # rag's prompt tokenizer falls back to its estimate instead of retrying the hub
+        "EMBEDDING_URLS": ",".join(f"{embed.url}/embed" for embed in embeds),
+        "LLM_URLS": ",".join(llm.url for llm in llms),
+        "LEXICAL_REBUILD_INTERVAL": "0",
+        "EXPIRY_SWEEP_INTERVAL": "0",
+        "TRACE_LOG": "0",
+    })
+    rag_main = load_service("rag")
+    rag = standins.serve(rag_main.app)
+    wait_for(lambda: httpx.get(f"{rag.url}/ready").status_code == 200)
+    wait_for(lambda: httpx.get(f"{rag.url}/stats").json()["lexical_index"] is not None)
+    os.environ["RAG_URL"] = rag.url
+    ingest = standins.serve(load_service("ingest").app)
+    wait_for(lambda: httpx.get(f"{ingest.url}/ready").status_code == 200)
+
+    results = {
+        "git_commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "ingest": {},
+        "search": {},
+    }
+    exports = {
+        "csv": lambda: ("listings.csv", synthetic.csv_export(args.rows), "text/csv"),
+        "xlsx": lambda: ("listings.xlsx", synthetic.xlsx_export(args.rows),
+                         "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    }
+    for fmt in args.formats:
+        results["ingest"][fmt] = run_ingest(ingest.url, fmt, *exports[fmt]())
+
+    # each level gets its own queries so earlier levels don't warm the search cache
+    levels = [("hybrid", c) for c in args.concurrency] + [(mode, args.concurrency[0]) for mode in args.rank_modes]
+    queries = synthetic.search_queries(args.requests * len(levels) + args.stream_requests + 1)
+    for level, (mode, concurrency) in enumerate(levels):
+        batch = queries[level * args.requests:(level + 1) * args.requests]
+        name = f"c{concurrency}" if mode == "hybrid" else f"{mode}_c{concurrency}"
+        results["search"][name] = asyncio.run(run_search(rag.url, batch, concurrency, args.n_results, mode))
+    if args.stream_requests:
+        results["stream"] = asyncio.run(run_stream(rag.url, queries[-args.stream_requests - 1:-1],
+                                                   args.stream_concurrency, args.n_results))
+    if args.burst:
+        before = httpx.get(f"{rag.url}/stats").json()["coalescing"]["search_stream"]["coalesced"]
+        results["burst"] = asyncio.run(run_stream(rag.url, [queries[-1]] * args.burst, args.burst, args.n_results))
+        after = httpx.get(f"{rag.url}/stats").json()["coalescing"]["search_stream"]["coalesced"]
+        results["burst"]["coalesced"] = after - before
+        print(f"burst  {args.burst} identical streams, {after - before} coalesced")
+    results["stages"] = {"rag": scrape_stages(rag.url), "ingest": scrape_stages(ingest.url)}
+    # requests each replica served, to check the clients spread load across them
+    upstreams = {"rag": httpx.get(f"{rag.url}/stats").json()["upstreams"],
+                 "ingest": httpx.get(f"{ingest.url}/stats").json()["upstreams"]}
+    results["upstreams"] = {
+        f"{service}_{upstream}": [replica["requests"] for replica in replicas]
+        for service, pools in upstreams.items() for upstream, replicas in pools.items()
+    }
+    print("replica requests " + json.dumps(results["upstreams"]))
+
+    for served in (ingest, rag, *llms, *embeds):
+        served.stop()
+
+    os.makedirs(args.out, exist_ok=True)
+    path = Path(args.out) / f"{time.strftime('%Y%m%d-%H%M%S')}-{results['git_commit']}.json"
+    path.write_text(json.dumps(results, indent=2))
+    print("\nstage means (ms): " + json.dumps({s: {k: v['mean_ms'] for k, v in st.items()}
+                                              for s, st in results["stages"].items()}))
+    print(f"results written to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(json.load(f), results, args.max_regression):
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+In-process stand-ins for the pieces of the stack the benchmarks don't measure:
+
+- FakeChroma: a `chromadb` module replacement (HttpClient, collections with
+  upsert/get/query/update/delete and `where` filters) backed by numpy, shared by every
+  service loaded in the process.
+- embed_app(): the embed service's /embed wire protocol with deterministic
+  bag-of-words vectors, so similar listings land near each other, and /rerank.
+- llm_app(): /generate and the /generate-stream and /v2/generate-stream
+  websockets with a fake token streamer and configurable time-to-first-token /
+  per-token delays.
+
+serve(app) runs any ASGI app on a free localhost port in a background thread.
+"""
+import asyncio
+import json
+import re
+import socket
+import sys
+import threading
+import time
+import types
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+
+EMBED_DIM = 384
+WIRE_MEDIA_TYPE = "application/x-float32"
+
+
+# --- Chroma ---
+
+def _matches(meta: dict, where: dict) -> bool:
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(meta, c) for c in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches(meta, c) for c in condition):
+                return False
+            continue
+        if key not in meta:
+            return False
+        value = meta[key]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            ok = {
+                "$eq": lambda: value == operand,
+                "$ne": lambda: value != operand,
+                "$gt": lambda: value > operand,
+                "$gte": lambda: value >= operand,
+                "$lt": lambda: value < operand,
+                "$lte": lambda: value <= operand,
+                "$in": lambda: value in operand,
+                "$nin": lambda: value not in operand,
+            }[op]
+            try:
+                if not ok():
+                    return False
+            except TypeError:
+                # Chroma doesn't compare across types either
+                return False
+    return True
+
+
+class FakeCollection:
+    """Brute-force squared-L2 search (Chroma's default space) over a growable matrix."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.metadata = None
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._vectors = np.zeros((0, EMBED_DIM), dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def modify(self, name=None, metadata=None):
+        if metadata is not None:
+            self.metadata = dict(metadata)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            for doc_id, vector, document, meta in zip(ids, embeddings, documents, metadatas):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._grow(row + 1, vector.shape[0])
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                    self._metadatas.append(meta)
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = meta
+                self._vectors[row] = vector
+                self._live[row] = True
+
+    def update(self, ids, metadatas=None):
+        with self._lock:
+            for doc_id, meta in zip(ids, metadatas or []):
+                row = self._rows.get(doc_id)
+                if row is not None:
+                    self._metadatas[row] = {**(self._metadatas[row] or {}), **meta}
+
+    def _grow(self, rows: int, dim: int):
+        if self._vectors.shape[1] != dim and not len(self._ids):
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+        if rows > self._vectors.shape[0]:
+            capacity = max(rows, 2 * self._vectors.shape[0], 1024)
+            vectors = np.zeros((capacity, dim), dtype=np.float32)
+            vectors[:self._vectors.shape[0]] = self._vectors
+            live = np.zeros(capacity, dtype=bool)
+            live[:self._live.shape[0]] = self._live
+            self._vectors, self._live = vectors, live
+
+    def delete(self, ids=None):
+        with self._lock:
+            for doc_id in ids or []:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._live[row] = False
+
+    def _result(self, rows, include, nested: bool, distances=None) -> dict:
+        wrap = (lambda values: [values]) if nested else (lambda values: values)
+        out = {"ids": wrap([self._ids[r] for r in rows])}
+        if "documents" in include:
+            out["documents"] = wrap([self._documents[r] for r in rows])
+        if "metadatas" in include:
+            out["metadatas"] = wrap([self._metadatas[r] for r in rows])
+        if distances is not None:
+            out["distances"] = wrap(distances)
+        return out
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include=("documents", "metadatas")):
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[i] for i in ids if i in self._rows]
+            else:
+                rows = [r for r in np.flatnonzero(self._live[:len(self._ids)])]
+            if where:
+                rows = [r for r in rows if _matches(self._metadatas[r] or {}, where)]
+            rows = rows[offset:offset + limit if limit is not None else None]
+            return self._result(rows, include, nested=False)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        query_vector = np.asarray(query_embeddings[0], dtype=np.float32)
+        with self._lock:
+            live = np.flatnonzero(self._live[:len(self._ids)])
+            distances = ((self._vectors[live] - query_vector) ** 2).sum(axis=1)
+            rows, row_distances = [], []
+            for i in np.argsort(distances, kind="stable"):
+                row = live[i]
+                if where and not _matches(self._metadatas[row] or {}, where):
+                    continue
+                rows.append(row)
+                row_distances.append(float(distances[i]))
+                if len(rows) == n_results:
+                    break
+            return self._result(rows, include, nested=True, distances=row_distances)
+
+
+class FakeChroma:
+    """Collections shared by every FakeChroma.HttpClient in the process, like one Chroma server."""
+
+    collections = {}
+
+    class HttpClient:
+        def __init__(self, host=None, port=None, **kwargs):
+            pass
+
+        def get_collection(self, name):
+            if name not in FakeChroma.collections:
+                raise ValueError(f"Collection {name} does not exist.")
+            return FakeChroma.collections[name]
+
+        def get_or_create_collection(self, name, **kwargs):
+            return FakeChroma.collections.setdefault(name, FakeCollection(name))
+
+    @classmethod
+    def install(cls):
+        module = types.ModuleType("chromadb")
+        module.HttpClient = cls.HttpClient
+        sys.modules["chromadb"] = module
+
+
+# --- embed ---
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token: str) -> np.ndarray:
+    return np.random.default_rng(zlib.crc32(token.encode())).standard_normal(EMBED_DIM).astype(np.float32)
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    vector = np.zeros(EMBED_DIM, dtype=np.float32)
+    for token in TOKEN.findall(text.lower()):
+        vector += _token_vector(token)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_app(latency_ms: float = 0.0, per_text_ms: float = 0.0) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return {"status": "Embed stand-in is healthy"}, 200
+
+    @app.post("/embed")
+    async def embed(request: Request):
+        data = await request.json()
+        texts = data["texts"]
+        delay = latency_ms + per_text_ms * len(texts)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        vectors = np.stack([fake_embedding(t) for t in texts]).astype("<f4")
+        if WIRE_MEDIA_TYPE in request.headers.get("accept", ""):
+            return Response(
+                content=vectors.tobytes(),
+                media_type=WIRE_MEDIA_TYPE,
+                headers={"X-Embedding-Shape": ",".join(str(n) for n in vectors.shape), "X-Embedding-Dtype": "<f4"},
+            )
+        return {"embeddings": vectors.tolist()}, 200
+
+    @app.post("/rerank")
+    async def rerank(request: Request):
+        # cosine similarity stands in for the cross-encoder; same per-request latency model as /embed
+        data = await request.json()
+        documents = data["documents"]
+        delay = latency_ms + per_text_ms * len(documents)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        query = fake_embedding(data["query"])
+        return {"scores": [float(fake_embedding(d or "") @ query) for d in documents]}
+
+    return app
+
+
+# --- llm ---
+
+WORDS = "the best match is listing one because it asks for python and sql skills and is remote".split()
+
+
+def llm_app(ttft_ms: float = 50.0, token_ms: float = 5.0, tokens: int = 64) -> FastAPI:
+    app = FastAPI()
+
+    def fake_tokens():
+        return [WORDS[i % len(WORDS)] + " " for i in range(tokens)]
+
+    @app.get("/health")
+    def health():
+        return {"status": "LLM service is healthy"}
+
+    @app.post("/generate")
+    async def generate(request: Request):
+        await request.json()
+        await asyncio.sleep((ttft_ms + token_ms * tokens) / 1000)
+        return {"response": "".join(fake_tokens()).strip()}
+
+    @app.websocket("/generate-stream")
+    async def generate_stream(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                json.loads(await websocket.receive_text())
+                await websocket.send_text(json.dumps({"type": "start", "message": "Starting generation..."}))
+                await asyncio.sleep(ttft_ms / 1000)
+                full = ""
+                for token in fake_tokens():
+                    full += token
+                    await websocket.send_text(json.dumps({"type": "token", "token": token, "full_text": full}))
+                    if token_ms:
+                        await asyncio.sleep(token_ms / 1000)
+                await websocket.send_text(json.dumps({"type": "complete", "full_response": full}))
+        except WebSocketDisconnect:
+            pass
+
+    @app.websocket("/v2/generate-stream")
+    async def generate_stream_v2(websocket: WebSocket):
+        # one delta per token (no coalescing window); a stop message ends the stream early
+        await websocket.accept()
+        incoming = None
+        try:
+            while True:
+                message = json.loads(await (incoming or websocket.receive_text()))
+                incoming = None
+                if message.get("type") == "stop":
+                    continue
+                await websocket.send_text(json.dumps({"type": "start"}))
+                incoming = asyncio.ensure_future(websocket.receive_text())
+                await asyncio.sleep(ttft_ms / 1000)
+                pieces = 0
+                for token in fake_tokens():
+                    if incoming.done():
+                        break
+                    pieces += 1
+                    await websocket.send_text(json.dumps({"type": "delta", "text": token}))
+                    if token_ms:
+                        await asyncio.sleep(token_ms / 1000)
+                if incoming.done():
+                    incoming.result()  # raises WebSocketDisconnect if the client left
+                reason = "stopped" if incoming.done() else "finished"
+                await websocket.send_text(json.dumps({"type": "complete", "reason": reason, "pieces": pieces}))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if incoming is not None:
+                incoming.cancel()
+
+    return app
+
+
+# --- serving ---
+
+class Served:
+    def __init__(self, server: uvicorn.Server, thread: threading.Thread, port: int):
+        self.server = server
+        self.thread = thread
+        self.url = f"http://127.0.0.1:{port}"
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def serve(app, timeout: float = 30.0) -> Served:
+    """Run an ASGI app with uvicorn on a free port in a daemon thread, including its startup hooks."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError(f"Server on port {port} failed to start")
+        time.sleep(0.01)
+    return Served(server, thread, port)
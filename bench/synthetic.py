@@ -0,0 +1,99 @@
+"""Synthetic job-listing exports in the two upload formats ingest accepts, plus search queries."""
+import io
+import random
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+TITLES = ["Software Engineering Intern", "Data Analyst", "Research Assistant", "Marketing Coordinator",
+          "Teaching Assistant", "Mechanical Engineer", "Accounting Intern", "Product Designer",
+          "Machine Learning Engineer", "Customer Success Associate", "Lab Technician", "Financial Analyst"]
+EMPLOYMENT_TYPES = ["Internship", "Full-Time", "Part-Time", "On-Campus Student Employment", "Fellowship"]
+WORK_MODELS = ["Remote", "Hybrid", "On-site", "Onsite internship", "Full-time"]
+SKILLS = ["python", "sql", "excel", "react", "typescript", "solidworks", "tableau", "c++", "spss",
+          "salesforce", "figma", "kubernetes", "pipetting", "quickbooks", "photoshop", "matlab"]
+SALARIES = ["$18/hr", "$22.50 per hour", "$50,000 - $65,000/yr", "80k-100k a year", "Competitive", "",
+            "$45,000 per annum", "$15 - $20/hr"]
+CITIES = ["Provo, UT", "Salt Lake City, UT", "Austin, TX", "Seattle, WA", "Remote"]
+EMPLOYERS = 2000
+
+
+def _listing(rng: random.Random, i: int) -> dict:
+    return {
+        "title": rng.choice(TITLES),
+        "employer": f"Company {rng.randrange(EMPLOYERS)}",
+        "salary": rng.choice(SALARIES),
+        "city": rng.choice(CITIES),
+        "roles": " ".join(rng.sample(SKILLS, 4)),
+        "posted_days_ago": rng.randrange(60),
+    }
+
+
+def _salary_type(salary: str):
+    if "hr" in salary or "hour" in salary:
+        return "Hourly"
+    return "Yearly" if any(c.isdigit() for c in salary) else None
+
+
+def csv_export(rows: int, seed: int = 0, url_prefix: str = "https://jobs.example.com/csv/") -> bytes:
+    """Listings in the CSV export layout (Position Title, Work Model, Company, ..., Apply, Date)."""
+    rng = random.Random(seed)
+    today = pd.Timestamp.now().normalize()
+    records = []
+    for i in range(rows):
+        listing = _listing(rng, i)
+        records.append({
+            "Position Title": listing["title"],
+            "Work Model": rng.choice(WORK_MODELS),
+            "Company": listing["employer"],
+            "Salary": listing["salary"],
+            "Location": listing["city"],
+            "Qualifications": listing["roles"],
+            "Apply": f"{url_prefix}{i}",
+            "Date": (today - pd.Timedelta(days=listing["posted_days_ago"])).strftime("%Y-%m-%d"),
+        })
+    return pd.DataFrame.from_records(records).to_csv(index=False).encode()
+
+
+def xlsx_export(rows: int, seed: int = 1, url_prefix: str = "https://jobs.example.com/xlsx/") -> bytes:
+    """Listings in the Handshake Excel layout, with the apply link as a hyperlink on the title cell."""
+    rng = random.Random(seed)
+    today = pd.Timestamp.now().normalize()
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Title", "Employment Type", "Employer", "Expires", "Job Salary", "Salary Type",
+                  "Job Location", "Location Type", "Residential Address", "Job Roles"])
+    for i in range(rows):
+        listing = _listing(rng, i)
+        title = WriteOnlyCell(sheet, value=listing["title"])
+        title.hyperlink = f"{url_prefix}{i}"
+        salary = listing["salary"]
+        sheet.append([
+            title,
+            rng.choice(EMPLOYMENT_TYPES),
+            listing["employer"],
+            (today + pd.Timedelta(days=90 - listing["posted_days_ago"])).to_pydatetime(),
+            salary,
+            _salary_type(salary),
+            listing["city"],
+            rng.choice(["Remote", "Hybrid", "Onsite"]),
+            None,
+            listing["roles"],
+        ])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def search_queries(n: int, seed: int = 2) -> list:
+    """Distinct queries mixing titles, skills and employer names (so the search cache doesn't absorb them)."""
+    rng = random.Random(seed)
+    queries = set()
+    while len(queries) < n:
+        parts = [rng.choice(TITLES).split()[0].lower(), rng.choice(SKILLS)]
+        if rng.random() < 0.3:
+            parts.append(f"company {rng.randrange(EMPLOYERS)}")
+        parts.append(rng.choice(["remote", "intern", "part time", "entry level", str(rng.randrange(10_000))]))
+        queries.add(" ".join(parts))
+    return sorted(queries, key=lambda q: rng.random())
@@ -0,0 +1,306 @@
+"""
+Clients for backends that run as several replicas (embed, llm).
+
+    embed = Client(replica_urls("EMBEDDING_URLS", "EMBEDDING_URL", "http://embed:8003/embed", path="/embed"), "embed")
+    resp = embed.post("/embed", json={"texts": texts}, deadline=30)
+
+    llm = AsyncClient(replica_urls("LLM_URLS", "LLM_URL", "http://llm:7860"), "llm", timeout=150)
+    resp = await llm.post("/generate", json={"prompt": prompt})
+    async with llm.session(lambda url: websockets.connect(url + "/v2/generate-stream")) as ws:
+        ...
+    async for frame in llm.stream(connect, lambda ws: frames(ws, prompt)):   # frames raises Busy
+        ...
+
+Each call goes to the replica with the fewest requests outstanding from this
+process, over a keep-alive connection pool. Connection errors, timeouts and
+429/5xx-overloaded answers are retried on another replica after a jittered
+backoff, within the call's deadline; a replica that fails eject_after times in a
+row is skipped for eject_seconds (unless every replica is ejected). Overloaded
+answers (429/503, or Busy from a stream) are retried the same way but don't count
+as failures: a saturated replica is healthy and shouldn't be ejected.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Callable, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import counter
+
+# answers that mean "this replica can't take it right now", not "bad request"
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# ...of those, the ones that mean "saturated" rather than "broken"
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+RETRIES = counter("upstream_retries_total", "Calls to a backend retried on another replica", ("upstream",))
+EJECTIONS = counter("upstream_ejections_total", "Replicas taken out of rotation after repeated failures",
+                    ("upstream", "replica"))
+
+
+class Unavailable(Exception):
+    """No replica answered within the call's deadline and retries."""
+
+
+class Busy(Exception):
+    """A replica turned a streamed request away because it is saturated."""
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or "busy")
+        self.retry_after = retry_after
+
+
+def replica_urls(list_var: str, single_var: str, default: str, path: str = "") -> List[str]:
+    """
+    Base URLs from a comma-separated list variable (e.g. EMBEDDING_URLS), falling
+    back to the older single-URL variable. A trailing endpoint `path` is stripped,
+    so EMBEDDING_URL=http://embed:8003/embed keeps working.
+    """
+    urls = []
+    for url in (os.getenv(list_var) or os.getenv(single_var) or default).split(","):
+        url = url.strip().rstrip("/")
+        if path and url.endswith(path):
+            url = url[:-len(path)]
+        if url:
+            urls.append(url)
+    return urls
+
+
+def backoff(attempt: int, base: float, cap: float = 2.0) -> float:
+    # "full jitter": spreads retries from many callers instead of synchronizing them
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class _Replica:
+    __slots__ = ("url", "outstanding", "failures", "ejected_until", "requests", "errors")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+
+class ReplicaPool:
+    """Least-outstanding-requests routing with passive ejection of failing replicas."""
+
+    def __init__(self, urls: List[str], name: str, eject_after: int = 3, eject_seconds: float = 10.0):
+        if not urls:
+            raise ValueError(f"No replica URLs configured for {name}")
+        self.name = name
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.replicas = [_Replica(url) for url in urls]
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: tuple = ()) -> _Replica:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas if r not in exclude] or self.replicas
+            healthy = [r for r in candidates if r.ejected_until <= now]
+            if healthy:
+                fewest = min(r.outstanding for r in healthy)
+                replica = random.choice([r for r in healthy if r.outstanding == fewest])
+            else:
+                # everything is ejected: try the one due back soonest rather than failing outright
+                replica = min(candidates, key=lambda r: r.ejected_until)
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def release(self, replica: _Replica, ok: bool):
+        with self._lock:
+            replica.outstanding -= 1
+            if ok:
+                replica.failures = 0
+                return
+            replica.errors += 1
+            replica.failures += 1
+            if replica.failures >= self.eject_after:
+                replica.failures = 0
+                replica.ejected_until = time.monotonic() + self.eject_seconds
+                EJECTIONS.labels(self.name, replica.url).inc()
+                print(f"Ejected {self.name} replica {replica.url} for {self.eject_seconds}s after repeated failures")
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": r.url,
+                    "outstanding": r.outstanding,
+                    "requests": r.requests,
+                    "errors": r.errors,
+                    "ejected_for_seconds": round(r.ejected_until - now, 1) if r.ejected_until > now else 0,
+                }
+                for r in self.replicas
+            ]
+
+
+class Client:
+    """Blocking client, safe to share between threads (ingest jobs, rag's to_thread search path)."""
+
+    def __init__(self, urls: List[str], name: str, timeout: float = 30.0, retries: int = 2,
+                 backoff_base: float = 0.05, pool_size: int = 32, **pool_kwargs):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.pool = ReplicaPool(urls, name, **pool_kwargs)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def post(self, path: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        """
+        POST to the least busy replica, retrying others until `deadline` seconds
+        (default: the client timeout) have passed. Returns the last response even
+        if it is an error status; raises Unavailable if no replica answered.
+        """
+        deadline_at = time.monotonic() + (deadline or self.timeout)
+        tried, response, error = [], None, None
+        for attempt in range(self.retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                RETRIES.labels(self.name).inc()
+            replica = self.pool.acquire(tuple(tried))
+            ok = healthy = False
+            try:
+                response = self._session.post(replica.url + path, timeout=remaining, **kwargs)
+                ok = response.status_code not in RETRY_STATUSES
+                healthy = ok or response.status_code in OVERLOAD_STATUSES
+            except requests.RequestException as e:
+                error = e
+            finally:
+                self.pool.release(replica, healthy)
+            if ok:
+                return response
+            tried.append(replica)
+            time.sleep(min(backoff(attempt, self.backoff_base), max(deadline_at - time.monotonic(), 0)))
+        if response is not None:
+            return response
+        raise Unavailable(f"No {self.name} replica answered {path}: {error or 'deadline exceeded'}")
+
+    def stats(self) -> list:
+        return self.pool.stats()
+
+
+class AsyncClient:
+    """asyncio client for the same routing; one per process, closed with aclose() at shutdown."""
+
+    def __init__(self, urls: List[str], name: str, timeout: float = 30.0, retries: int = 2,
+                 backoff_base: float = 0.05, pool_size: int = 32, **pool_kwargs):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.pool = ReplicaPool(urls, name, **pool_kwargs)
+        self._client = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=pool_size))
+
+    async def post(self, path: str, deadline: Optional[float] = None, **kwargs) -> httpx.Response:
+        """Same contract as Client.post."""
+        deadline_at = time.monotonic() + (deadline or self.timeout)
+        tried, response, error = [], None, None
+        for attempt in range(self.retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                RETRIES.labels(self.name).inc()
+            replica = self.pool.acquire(tuple(tried))
+            ok = healthy = False
+            try:
+                response = await self._client.post(replica.url + path, timeout=remaining, **kwargs)
+                ok = response.status_code not in RETRY_STATUSES
+                healthy = ok or response.status_code in OVERLOAD_STATUSES
+            except httpx.TransportError as e:
+                error = e
+            finally:
+                self.pool.release(replica, healthy)
+            if ok:
+                return response
+            tried.append(replica)
+            await asyncio.sleep(min(backoff(attempt, self.backoff_base), max(deadline_at - time.monotonic(), 0)))
+        if response is not None:
+            return response
+        raise Unavailable(f"No {self.name} replica answered {path}: {error or 'deadline exceeded'}")
+
+    @asynccontextmanager
+    async def session(self, connect: Callable[[str], AsyncContextManager], tried: Optional[list] = None):
+        """
+        Hold a replica for a long-lived exchange such as a websocket stream.
+        connect(base_url) returns the async context manager that opens it; a
+        replica that fails to open is retried on another one, while an error
+        after that is only counted against the replica (unless it is Busy) and
+        re-raised. Replicas in `tried` are avoided, and the one used is added.
+        """
+        tried, error = [] if tried is None else tried, None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                RETRIES.labels(self.name).inc()
+                await asyncio.sleep(backoff(attempt - 1, self.backoff_base))
+            replica = self.pool.acquire(tuple(tried))
+            opener = connect(replica.url)
+            try:
+                conn = await opener.__aenter__()
+            except Exception as e:
+                self.pool.release(replica, False)
+                tried.append(replica)
+                error = e
+                continue
+            tried.append(replica)
+            failed = False
+            try:
+                yield conn
+            except BaseException as e:
+                # cancellation, the caller going away or a full replica isn't the replica's fault
+                failed = isinstance(e, Exception) and not isinstance(e, Busy)
+                if not await opener.__aexit__(type(e), e, e.__traceback__):
+                    raise
+            else:
+                await opener.__aexit__(None, None, None)
+            finally:
+                self.pool.release(replica, not failed)
+            return
+        raise Unavailable(f"No {self.name} replica could be reached: {error}")
+
+    async def stream(self, connect: Callable[[str], AsyncContextManager],
+                     exchange: Callable[[object], AsyncIterator]) -> AsyncIterator:
+        """
+        Items of exchange(conn) over a session(connect). A replica that raises
+        Busy before the first item is left for another one, after a backoff (or
+        the replica's retry_after once every replica has been tried).
+        """
+        tried = []
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                async with self.session(connect, tried) as conn:
+                    async for item in exchange(conn):
+                        started = True
+                        yield item
+                return
+            except Busy as e:
+                if started or attempt == self.retries:
+                    raise
+                RETRIES.labels(self.name).inc()
+                delay = backoff(attempt, self.backoff_base)
+                if e.retry_after and len(set(tried)) >= len(self.pool.replicas):
+                    delay = e.retry_after
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def stats(self) -> list:
+        return self.pool.stats()
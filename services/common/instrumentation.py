@@ -0,0 +1,149 @@
+"""
+Request metrics, stage timers and trace propagation shared by the FastAPI services.
+
+docker-compose mounts this directory at /common and puts it on PYTHONPATH.
+
+    instrument(app, "rag")                  # /metrics, per-route latency, in-flight gauge, X-Trace-Id
+    with stage("chroma_query"):             # stage histogram + this request's breakdown
+        ...
+    requests.post(url, headers=trace_headers())
+
+Every request gets a trace ID (taken from an incoming X-Trace-Id header or
+generated) that is echoed in the response. Calls to other services pass it on
+via trace_headers(), and each service logs one line per request with its stage
+breakdown, so a single search can be followed across rag, embed and llm.
+"""
+import contextvars
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+TRACE_HEADER = "X-Trace-Id"
+# print one line per request with its stage breakdown
+TRACE_LOG = os.getenv("TRACE_LOG", "1") != "0"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# one registry per service process; nothing is registered on prometheus_client's global one
+registry = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route (websockets: connection lifetime)",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", registry=registry)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in a pipeline stage", ["stage"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+STAGE_ERRORS = Counter("stage_errors_total", "Pipeline stages that raised", ["stage"], registry=registry)
+TOKENS_PER_SECOND = Histogram(
+    "generation_tokens_per_second", "Generation throughput per request or batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000), registry=registry,
+)
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_stages = contextvars.ContextVar("trace_stages", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace_headers() -> dict:
+    """Headers that carry the current trace ID to another service."""
+    trace_id = _trace_id.get()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    trace_id = trace_id or uuid.uuid4().hex
+    _trace_id.set(trace_id)
+    _stages.set({})
+    return trace_id
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_LATENCY.labels(name).observe(seconds)
+    stages = _stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_tokens_per_second(tokens: int, seconds: float):
+    if tokens and seconds > 0:
+        TOKENS_PER_SECOND.observe(tokens / seconds)
+
+
+def counter(name: str, documentation: str, labels: tuple = ()) -> Counter:
+    return Counter(name, documentation, labels, registry=registry)
+
+
+def gauge(name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+    """Gauge whose value is read from the service (queue depths, running jobs) at scrape time."""
+    metric = Gauge(name, documentation, registry=registry)
+    metric.set_function(read)
+    return metric
+
+
+class _InstrumentMiddleware:
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope.get("headers") or [])
+        trace_id = start_trace(incoming.get(TRACE_HEADER.lower().encode(), b"").decode("latin-1") or None)
+        stages = _stages.get()
+        method = scope.get("method", "WS")
+        status = {"code": "ws" if scope["type"] == "websocket" else 500}
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TRACE_HEADER.lower().encode(), trace_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            # the route template, not the raw path, so /jobs/{job_id} is one series
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            REQUEST_LATENCY.labels(method, route, str(status["code"])).observe(elapsed)
+            if stages and TRACE_LOG:
+                breakdown = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in stages.items())
+                print(f"[{self.service}] trace={trace_id} {method} {route} {status['code']} "
+                      f"{elapsed * 1000:.1f}ms {breakdown}")
+
+
+def instrument(app, service: str):
+    """Add request metrics, trace IDs and a Prometheus /metrics endpoint to a FastAPI app."""
+    app.add_middleware(_InstrumentMiddleware, service=service)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,140 @@
+"""
+Boot sequence shared by the services: opt-in debugger, timed startup phases and
+a readiness endpoint separate from the /health liveness check.
+
+    attach_debugger(5680)                    # only with DEBUGPY=1
+    startup = Startup("embed")               # right after the imports
+    readiness(app, startup)                  # GET /ready: 503 until startup.mark_ready()
+
+    async def boot():                        # a task created from the startup hook
+        await startup.step("load_model", load_model)
+        await startup.step("warmup", warm_up)
+        startup.mark_ready()
+
+Steps run in a worker thread, so the app accepts connections (and /health
+answers) while models load. Once ready, the service logs one line with the time
+spent in each phase.
+"""
+import asyncio
+import glob
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+# DEBUGPY=1 opens the service's debugpy port; DEBUGPY_WAIT=1 also blocks startup until a client attaches
+DEBUGPY = os.getenv("DEBUGPY", "0") == "1"
+DEBUGPY_WAIT = os.getenv("DEBUGPY_WAIT", "0") == "1"
+
+# what a torch load needs from a hub snapshot (see local_snapshot's `required`)
+TORCH_FILES = ["config.json", ("*.safetensors", "*.bin")]
+# weight formats the torch loaders never read; skipped when fetching hub snapshots
+NON_TORCH_FILES = ["*.h5", "*.msgpack", "*.ot", "*.tflite", "tf_model*", "flax_model*", "rust_model*",
+                   "coreml/*", "onnx/*", "openvino/*"]
+
+
+def attach_debugger(port: int):
+    if not DEBUGPY:
+        return
+    import debugpy
+    debugpy.listen(("0.0.0.0", port))
+    print(f"debugpy listening on port {port}")
+    if DEBUGPY_WAIT:
+        print("Waiting for debugger attach...")
+        debugpy.wait_for_client()
+
+
+def _has_files(path: str, required: list) -> bool:
+    for entry in required:
+        options = entry if isinstance(entry, tuple) else (entry,)
+        if not any(glob.glob(os.path.join(path, pattern)) for pattern in options):
+            return False
+    return True
+
+
+def local_snapshot(repo_id: str, allow_patterns: Optional[list] = None,
+                   ignore_patterns: Optional[list] = None, required: Optional[list] = None) -> str:
+    """
+    Local directory of a Hugging Face hub repo. Served from the hub cache (HF_HOME)
+    without any network round trips when it has been downloaded before; fetched
+    into the cache otherwise.
+
+    The cached snapshot may come from a download with other patterns (e.g. the
+    torch weights but not onnx/), so `required` lists the files (glob patterns;
+    a tuple means any one of them) this caller needs; if any is missing the
+    snapshot is fetched again with this call's patterns.
+    """
+    from huggingface_hub import snapshot_download
+    kwargs = {"allow_patterns": allow_patterns, "ignore_patterns": ignore_patterns}
+    try:
+        path = snapshot_download(repo_id, local_files_only=True, **kwargs)
+        if _has_files(path, required or []):
+            return path
+    except Exception:
+        pass
+    return snapshot_download(repo_id, **kwargs)
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process started (Linux only); covers interpreter start-up and imports."""
+    try:
+        with open("/proc/self/stat") as f:
+            # the command name may contain spaces; fields after it are space separated
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Startup:
+    def __init__(self, service: str):
+        self.service = service
+        self.ready = False
+        self.error = None
+        self.phases = {}
+        imports = _process_age()
+        if imports is not None:
+            self.phases["import"] = imports
+        self._created = time.perf_counter()
+        self.ready_after = None
+
+    async def step(self, name: str, fn, *args):
+        """Run one blocking startup phase in a worker thread and record how long it took."""
+        started = time.perf_counter()
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            self.error = f"{name}: {e}"
+            print(f"[{self.service}] startup step {name} failed: {e}")
+            raise
+        finally:
+            # cumulative, so a retried step reports all of its attempts
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def mark_ready(self):
+        self.ready = True
+        self.error = None
+        self.ready_after = self.phases.get("import", 0.0) + time.perf_counter() - self._created
+        breakdown = " ".join(f"{name}={seconds:.2f}s" for name, seconds in self.phases.items())
+        print(f"[{self.service}] ready in {self.ready_after:.2f}s: {breakdown}")
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "error": self.error,
+        }
+
+
+def readiness(app, startup: Startup):
+    """GET /ready: 200 once the service has finished starting up, 503 (with its progress) before that."""
+
+    @app.get("/ready")
+    def ready():
+        if not startup.ready:
+            raise HTTPException(status_code=503, detail=startup.status())
+        return startup.status()
@@ -0,0 +1,47 @@
+import os
+
+import huggingface_hub
+import pytest
+
+from startup import NON_TORCH_FILES, TORCH_FILES, local_snapshot
+
+REPO_FILES = ["config.json", "model.safetensors", "modules.json", "tokenizer.json", "onnx/model.onnx"]
+ONNX_FILES = ["onnx/model.onnx", "tokenizer.json", "modules.json", "sentence_bert_config.json"]
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    """A hub cache holding one snapshot directory, filled by non-local downloads."""
+    snapshot = tmp_path / "snapshot"
+    downloads = []
+
+    def snapshot_download(repo_id, local_files_only=False, allow_patterns=None, ignore_patterns=None):
+        if local_files_only:
+            if not snapshot.exists():
+                raise FileNotFoundError(repo_id)
+            return str(snapshot)
+        downloads.append(repo_id)
+        for name in huggingface_hub.utils.filter_repo_objects(
+                REPO_FILES, allow_patterns=allow_patterns, ignore_patterns=ignore_patterns):
+            (snapshot / name).parent.mkdir(parents=True, exist_ok=True)
+            (snapshot / name).write_text("")
+        return str(snapshot)
+
+    monkeypatch.setattr(huggingface_hub, "snapshot_download", snapshot_download)
+    return downloads
+
+
+def test_torch_then_onnx_downloads_onnx_export(hub):
+    torch_dir = local_snapshot("org/model", ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES)
+    assert not os.path.exists(os.path.join(torch_dir, "onnx", "model.onnx"))
+
+    onnx_dir = local_snapshot("org/model", allow_patterns=ONNX_FILES, required=["onnx/model.onnx", "tokenizer.json"])
+    assert os.path.exists(os.path.join(onnx_dir, "onnx", "model.onnx"))
+    assert hub == ["org/model", "org/model"]
+
+
+def test_complete_snapshot_served_from_cache(hub):
+    local_snapshot("org/model", ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES)
+    local_snapshot("org/model", ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES)
+    local_snapshot("org/model", allow_patterns=["tokenizer.json"], required=["tokenizer.json"])
+    assert hub == ["org/model"]
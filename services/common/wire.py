@@ -0,0 +1,26 @@
+"""
+The embed service's /embed response formats, shared by its clients (ingest, rag).
+
+    resp = embed.post("/embed", json={"texts": texts}, headers={"Accept": EMBED_WIRE_MEDIA_TYPE})
+    vectors = decode_embeddings(resp)    # (n, dim) float32
+"""
+import base64
+
+import numpy as np
+
+# binary wire format: contiguous little-endian float32, row-major
+EMBED_WIRE_MEDIA_TYPE = "application/x-float32"
+EMBED_WIRE_DTYPE = "<f4"
+
+
+def decode_embeddings(resp) -> np.ndarray:
+    """Read an /embed response (requests or httpx), preferring the binary float32 format over JSON."""
+    if resp.headers.get("content-type", "").startswith(EMBED_WIRE_MEDIA_TYPE):
+        shape = tuple(int(n) for n in resp.headers["X-Embedding-Shape"].split(","))
+        dtype = resp.headers.get("X-Embedding-Dtype", EMBED_WIRE_DTYPE)
+        return np.frombuffer(resp.content, dtype=dtype).reshape(shape)
+    # JSON bodies are wrapped in a (body, status) pair
+    body = resp.json()[0]
+    if "embeddings_b64" in body:
+        return np.frombuffer(base64.b64decode(body["embeddings_b64"]), dtype=body["dtype"]).reshape(body["shape"])
+    return np.asarray(body["embeddings"], dtype=np.float32)
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+
+from instrumentation import observe_stage
+
+
+class _Pending:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbedBatcher:
+    """
+    Dynamic micro-batcher for concurrent /embed calls.
+
+    Requests are queued; whenever a worker is free the scheduler drains the queue
+    for up to max_wait_ms (or until max_batch_size texts are waiting), sorts the
+    merged texts by length so similar lengths share a batch (less padding), runs
+    the batches on a thread pool off the event loop and scatters rows back to
+    each caller.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, workers: int = 1):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+        self._queue = None
+        self._slots = None
+        self._task = None
+        self._dispatches = set()
+        self.batches = 0
+        self.batched_texts = 0
+        self.requests = 0
+        self.wait_seconds = 0.0
+        self.in_flight = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(texts, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # only collect a batch once a worker can take it; meanwhile requests pile up
+            await self._slots.acquire()
+            pending = [await self._queue.get()]
+            count = len(pending[0].texts)
+            deadline = loop.time() + self.max_wait
+            while count < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                count += len(item.texts)
+            task = loop.create_task(self._dispatch(pending))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, pending: List[_Pending]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            # (length, request index, row) for every text, bucketed by length
+            rows = sorted((len(text), r, i) for r, item in enumerate(pending) for i, text in enumerate(item.texts))
+            results = [None] * len(pending)
+            for start in range(0, len(rows), self.max_batch_size):
+                bucket = rows[start:start + self.max_batch_size]
+                vectors = await loop.run_in_executor(
+                    self._executor, self.encode, [pending[r].texts[i] for _, r, i in bucket]
+                )
+                self.batches += 1
+                self.batched_texts += len(bucket)
+                for (_, r, i), vector in zip(bucket, vectors):
+                    if results[r] is None:
+                        results[r] = np.empty((len(pending[r].texts), vectors.shape[1]), dtype=vectors.dtype)
+                    results[r][i] = vector
+            for item, result in zip(pending, results):
+                self.requests += 1
+                self.wait_seconds += started - item.enqueued_at
+                observe_stage("queue_wait", started - item.enqueued_at)
+                if not item.future.done():
+                    item.future.set_result(result)
+        except Exception as e:
+            for item in pending:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_batches": self.in_flight,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.batched_texts,
+            "avg_batch_fill_ratio": round(self.batched_texts / (self.batches * self.max_batch_size), 4) if self.batches else None,
+            "avg_queue_wait_ms": round(self.wait_seconds / self.requests * 1000, 3) if self.requests else None,
+        }
@@ -0,0 +1,84 @@
+"""
+Parity check and throughput benchmark for the embed backends.
+
+    python benchmark.py
+    python benchmark.py --backends torch onnx-int8 --batch-sizes 1 32 --texts 1000
+
+Every backend is compared against the torch (sentence-transformers) reference on
+a sample of job listings: mean and worst-case cosine similarity per text, and
+texts/sec at each batch size.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from encoders import BACKENDS, load_encoder
+
+TITLES = ["Software Engineering Intern", "Data Analyst", "Research Assistant", "Marketing Coordinator",
+          "Teaching Assistant", "Mechanical Engineer", "Accounting Intern", "Product Designer",
+          "Machine Learning Engineer", "Customer Success Associate", "Lab Technician", "Financial Analyst"]
+EMPLOYMENT_TYPES = ["Internship", "Full-Time", "Part-Time", "On-Campus Student Employment", "Fellowship"]
+ROLES = ["python sql", "excel reporting", "react typescript", "cad solidworks", "customer support",
+         "statistics r", "copywriting social media", "pipetting lab safety"]
+
+
+def sample_listings(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    combos = list(itertools.product(TITLES, EMPLOYMENT_TYPES, ROLES))
+    return [" ".join(rng.choice(combos)) for _ in range(n)]
+
+
+def throughput(encoder, texts: list, batch_size: int) -> float:
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    started = time.perf_counter()
+    encoder.encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32, 128])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="fail the parity check if any text falls below this similarity")
+    args = parser.parse_args()
+
+    texts = sample_listings(args.texts)
+    reference = load_encoder("torch", args.model).encode(texts)
+    results, failed = [], False
+    for name in args.backends:
+        started = time.perf_counter()
+        encoder = load_encoder(name, args.model)
+        load_seconds = time.perf_counter() - started
+        vectors = encoder.encode(texts)
+        cosine = (vectors * reference).sum(axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+        )
+        result = {
+            "backend": name,
+            "load_seconds": round(load_seconds, 2),
+            "cosine_mean": round(float(cosine.mean()), 5),
+            "cosine_min": round(float(cosine.min()), 5),
+            "texts_per_sec": {bs: round(throughput(encoder, texts, bs), 1) for bs in args.batch_sizes},
+        }
+        failed |= result["cosine_min"] < args.min_cosine
+        results.append(result)
+
+    print(f"{'backend':<10} {'cos mean':>9} {'cos min':>9}  " + "  ".join(f"bs={bs:<5}" for bs in args.batch_sizes))
+    for r in results:
+        rates = "  ".join(f"{r['texts_per_sec'][bs]:<8}" for bs in args.batch_sizes)
+        print(f"{r['backend']:<10} {r['cosine_mean']:>9} {r['cosine_min']:>9}  {rates}")
+    print(json.dumps(results, indent=2))
+    if failed:
+        raise SystemExit(f"parity check failed: cosine similarity below {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class DiskStore:
+    """
+    Append-only on-disk embedding store: vectors live in a raw float32 file that is
+    read through a memory map, and index.tsv maps each cache key to its row.
+
+    Several embed replicas may share the directory: appends happen under an
+    exclusive lock on the `lock` file, after catching up on rows other processes
+    wrote, so row numbers never collide. A write torn by a crash is cut back to
+    whole rows / lines the next time the lock is taken.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._index_path = os.path.join(path, "index.tsv")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._lock_path = os.path.join(path, "lock")
+        self.dim = None
+        self.index = {}
+        self._rows = 0
+        self._index_offset = 0
+        self._mmap = None
+        with self._locked():
+            self._refresh()
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Catch up on rows appended since the last refresh; call with the lock held."""
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None:
+            return
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if size % row_bytes:
+            # a torn trailing append; later appends would be misaligned
+            os.truncate(self._vectors_path, size - size % row_bytes)
+        self._rows = size // row_bytes
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            tail = f.read()
+        complete = tail.rfind(b"\n") + 1
+        if complete < len(tail):
+            # partial last line from a crashed writer
+            os.truncate(self._index_path, self._index_offset + complete)
+        for line in tail[:complete].decode("utf-8").splitlines():
+            key, _, row = line.partition("\t")
+            # ignore index lines whose vector never made it to disk
+            if row.isdigit() and int(row) < self._rows:
+                self.index[key] = int(row)
+        self._index_offset += complete
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.index.get(key)
+        if row is None:
+            return None
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            self._mmap = np.memmap(self._vectors_path, dtype="<f4", mode="r", shape=(self._rows, self.dim))
+        return np.array(self._mmap[row])
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        with self._locked():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self.index]
+            if not new:
+                return
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.asarray([v for _, v in new], dtype="<f4").tobytes())
+            lines = "".join(f"{key}\t{self._rows + i}\n" for i, (key, _) in enumerate(new)).encode("utf-8")
+            with open(self._index_path, "ab") as f:
+                f.write(lines)
+            for i, (key, _) in enumerate(new):
+                self.index[key] = self._rows + i
+            self._rows += len(new)
+            self._index_offset += len(lines)
+
+
+class EmbeddingCache:
+    """
+    LRU of float32 vectors bounded by max_bytes, optionally backed by a DiskStore
+    so that entries evicted from memory (or computed before a restart) are reused.
+    """
+
+    def __init__(self, model_name: str, max_bytes: int, disk_dir: Optional[str] = None):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.disk = None
+        if disk_dir:
+            self.disk = DiskStore(os.path.join(disk_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)))
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        return cache_key(self.model_name, text)
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        found = []
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                elif self.disk is not None and (vector := self.disk.get(key)) is not None:
+                    self._insert(key, vector)
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                found.append(vector)
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._insert(key, vector)
+            if self.disk is not None:
+                self.disk.put_many(keys, vectors)
+
+    def _insert(self, key: str, vector: np.ndarray):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self.disk) if self.disk is not None else None,
+            }
@@ -1,25 +1,100 @@
 from typing import List
 import os
-from sentence_transformers import SentenceTransformer
+import threading
+import numpy as np
+from cache import EmbeddingCache
+from encoders import EMBED_BACKEND, load_cross_encoder, load_encoder
+from instrumentation import stage
 
 _EMBED_MODEL = os.getenv("SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+# in-memory cache budget; set EMBED_CACHE_DIR to also persist vectors across restarts
+_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+_CACHE_DIR = os.getenv("EMBED_CACHE_DIR") or None
 
-# lazy model
+# cross-encoder behind /rerank; empty disables it
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+
+# loaded in the background at startup (or by the first /embed that gets there first)
 _local_model = None
+_model_lock = threading.Lock()
+_cross_encoder = None
+
+# shapes like real traffic: single search queries and a full batch of listing texts
+WARMUP_QUERY = "software engineering intern python sql remote"
+WARMUP_LISTING = (
+    "Title: Data Analyst | Employment Type: Full-Time | Employer: Example Company | "
+    "Job Location: Provo, UT | Location Type: Hybrid | Job Salary: $50,000 - $65,000/yr | "
+    "Job Roles: sql excel tableau python reporting dashboards stakeholder communication"
+)
+WARMUP_BATCH = int(os.getenv("EMBED_WARMUP_BATCH", "32"))
+
+# vectors from other backends differ slightly, so they get their own cache namespace
+cache = EmbeddingCache(
+    _EMBED_MODEL if EMBED_BACKEND == "torch" else f"{_EMBED_MODEL}@{EMBED_BACKEND}",
+    _CACHE_MAX_BYTES,
+    _CACHE_DIR,
+)
 
 def _load_local_model():
     global _local_model
-    if _local_model is None:
-        _local_model = SentenceTransformer(_EMBED_MODEL)
+    with _model_lock:
+        if _local_model is None:
+            _local_model = load_encoder(EMBED_BACKEND, _EMBED_MODEL)
     return _local_model
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def _load_cross_encoder():
+    global _cross_encoder
+    with _model_lock:
+        if _cross_encoder is None:
+            _cross_encoder = load_cross_encoder(RERANK_MODEL, RERANK_MAX_LENGTH)
+    return _cross_encoder
+
+def load_model():
+    _load_local_model()
+    if RERANK_MODEL:
+        _load_cross_encoder()
+
+def warm_up():
     """
-    Return a list of embeddings for the input texts.
-    uses local sentence-transformers model.
+    Run the encoder on query- and batch-shaped inputs so the first real request
+    doesn't pay for kernel selection and allocator growth. Bypasses the cache.
     """
-    # local
     model = _load_local_model()
-    emb = model.encode(texts, convert_to_numpy=False)
-    # model.encode may return list of numpy arrays — convert to plain lists
-    return [list(map(float, e)) for e in emb]
\ No newline at end of file
+    model.encode([WARMUP_QUERY])
+    model.encode([WARMUP_LISTING] * WARMUP_BATCH)
+    if RERANK_MODEL:
+        rerank_scores(WARMUP_QUERY, [WARMUP_LISTING] * RERANK_BATCH_SIZE)
+
+def rerank_scores(query_text: str, documents: List[str]) -> np.ndarray:
+    """Cross-encoder relevance of each document to the query, scored as one batch of (query, document) pairs."""
+    model = _load_cross_encoder()
+    with stage("cross_encode"):
+        scores = model.predict([(query_text, d) for d in documents], batch_size=RERANK_BATCH_SIZE,
+                               convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(scores, dtype=np.float32)
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Return a (len(texts), dim) float32 array of embeddings for the input texts.
+    uses the local EMBED_BACKEND encoder; only texts missing from the cache are encoded.
+    """
+    with stage("cache_lookup"):
+        keys = [cache.key(t) for t in texts]
+        vectors = cache.get_many(keys)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        # local
+        model = _load_local_model()
+        # duplicate texts within one request are encoded once
+        unique = {}
+        for i in missing:
+            unique.setdefault(keys[i], texts[i])
+        with stage("encode"):
+            encoded = model.encode(list(unique.values()))
+        cache.put_many(list(unique.keys()), encoded)
+        by_key = dict(zip(unique.keys(), encoded))
+        for i in missing:
+            vectors[i] = by_key[keys[i]]
+    return np.stack(vectors)
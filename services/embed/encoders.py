@@ -0,0 +1,120 @@
+import json
+import os
+from typing import List
+
+import numpy as np
+from startup import NON_TORCH_FILES, TORCH_FILES, local_snapshot
+
+# torch (sentence-transformers) | onnx | onnx-int8
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# where dynamically quantized ONNX models are written
+EMBED_ONNX_CACHE = os.getenv("EMBED_ONNX_CACHE", os.path.expanduser("~/.cache/embed-onnx"))
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_encoder(backend: str, model_name: str):
+    if backend == "torch":
+        return TorchEncoder(model_name)
+    if backend == "onnx":
+        return OnnxEncoder(model_name)
+    if backend == "onnx-int8":
+        return OnnxEncoder(model_name, quantize=True)
+    raise ValueError(f"Unknown EMBED_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def load_cross_encoder(model_name: str, max_length: int):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(_model_dir(model_name, ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES, org=False), max_length=max_length)
+
+
+def _repo_id(model_name: str) -> str:
+    # bare names like all-MiniLM-L6-v2 live under the sentence-transformers org
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def _model_dir(model_name: str, org: bool = True, **kwargs) -> str:
+    """A local model directory as-is; otherwise the hub repo's cached snapshot."""
+    if os.path.isdir(model_name):
+        return model_name
+    return local_snapshot(_repo_id(model_name) if org else model_name, **kwargs)
+
+
+class TorchEncoder:
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(_model_dir(model_name, ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES))
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+
+
+class OnnxEncoder:
+    """
+    Sentence-transformers model run through ONNX Runtime: the hub repo's exported
+    onnx/model.onnx (optionally int8 dynamically quantized) followed by the same
+    mean pooling and normalization the SentenceTransformer pipeline applies.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        local_dir = _model_dir(model_name, allow_patterns=[
+            "onnx/model.onnx", "tokenizer.json", "modules.json", "sentence_bert_config.json",
+        ], required=["onnx/model.onnx", "tokenizer.json"])
+        model_path = os.path.join(local_dir, "onnx", "model.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_name} has no onnx/model.onnx export")
+        if quantize:
+            # local directories are keyed by their absolute path, hub models by repo id
+            key = os.path.abspath(model_name).strip(os.sep) if os.path.isdir(model_name) else _repo_id(model_name)
+            model_path = self._quantized(model_path, key)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        max_seq_length = 256
+        config_path = os.path.join(local_dir, "sentence_bert_config.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                max_seq_length = json.load(f).get("max_seq_length", max_seq_length)
+        self.tokenizer = Tokenizer.from_file(os.path.join(local_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        self.normalize = False
+        modules_path = os.path.join(local_dir, "modules.json")
+        if os.path.exists(modules_path):
+            with open(modules_path) as f:
+                self.normalize = any(m.get("type", "").endswith("Normalize") for m in json.load(f))
+
+    @staticmethod
+    def _quantized(model_path: str, key: str) -> str:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(EMBED_ONNX_CACHE, key.replace(os.sep, "--").replace("/", "--"),
+                                      "model_qint8.onnx")
+        if not os.path.exists(quantized_path):
+            os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            token_embeddings = self.session.run(None, feeds)[0]
+            # mean pooling over real (unpadded) tokens
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32))
+        return np.concatenate(out)
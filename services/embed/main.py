@@ -1,22 +1,99 @@
+import base64
+import os
 import fastapi
-from embeddings import embed_texts
+import asyncio
+from embeddings import embed_texts, cache, load_model, rerank_scores, warm_up, RERANK_MODEL
+from batcher import EmbedBatcher
+from instrumentation import gauge, instrument, stage
+from startup import Startup, attach_debugger, readiness
+from wire import EMBED_WIRE_DTYPE, EMBED_WIRE_MEDIA_TYPE
 
-import debugpy
-debugpy.listen(("0.0.0.0", 5680))  # Use a unique port per service if debugging all at once
-print("Waiting for debugger attach...")
-# debugpy.wait_for_client()  # Optional: pause until debugger attaches
+attach_debugger(5680)
+startup = Startup("embed")
 
 app = fastapi.FastAPI()
+instrument(app, "embed")
+readiness(app, startup)
+
+batcher = EmbedBatcher(
+    embed_texts,
+    max_batch_size=int(os.getenv("EMBED_MAX_BATCH_SIZE", "64")),
+    max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "5")),
+    workers=int(os.getenv("EMBED_WORKERS", "1")),
+)
+gauge("embed_queue_depth", "Embed requests waiting for a batch", lambda: batcher.stats()["queue_depth"])
+gauge("embed_batches_in_flight", "Embed batches being encoded", lambda: batcher.in_flight)
+
+async def boot():
+    try:
+        await startup.step("load_model", load_model)
+        await startup.step("warmup", warm_up)
+    except Exception:
+        # /embed still retries the load on demand; /ready stays 503
+        return
+    startup.mark_ready()
+
+@app.on_event("startup")
+async def start_batcher():
+    batcher.start()
+    asyncio.get_running_loop().create_task(boot())
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
 
 @app.get("/health")
 def health():
     return {"status": "Embed service is healthy"}, 200
 
+@app.get("/stats")
+def stats():
+    return {"cache": cache.stats(), "batcher": batcher.stats(), "startup": startup.status()}
+
 @app.post("/embed")
 async def embed(request: fastapi.Request):
+    """
+    Response format is negotiated:
+      - Accept: application/x-float32 -> raw little-endian float32 bytes, shape in X-Embedding-Shape
+      - {"encoding": "base64"} in the body -> JSON with the same buffer base64-encoded
+      - otherwise the original JSON lists of floats
+    """
     data = await request.json()
     texts = data.get("texts", [])
     if not texts or not isinstance(texts, list):
-        return fastapi.HTTPException(status_code=400, detail="Invalid input: 'texts' must be a non-empty list.")
-    embeddings = embed_texts(texts)
-    return {"embeddings": embeddings}, 200
\ No newline at end of file
+        raise fastapi.HTTPException(status_code=400, detail="Invalid input: 'texts' must be a non-empty list.")
+    # checked before batching: one bad element would otherwise fail every request merged with it
+    if not all(isinstance(t, str) for t in texts):
+        raise fastapi.HTTPException(status_code=400, detail="Invalid input: every element of 'texts' must be a string.")
+    with stage("batch_embed"):
+        embeddings = (await batcher.embed(texts)).astype(EMBED_WIRE_DTYPE, copy=False)
+    if EMBED_WIRE_MEDIA_TYPE in request.headers.get("accept", ""):
+        return fastapi.Response(
+            content=embeddings.tobytes(),
+            media_type=EMBED_WIRE_MEDIA_TYPE,
+            headers={"X-Embedding-Shape": ",".join(str(n) for n in embeddings.shape), "X-Embedding-Dtype": EMBED_WIRE_DTYPE},
+        )
+    if data.get("encoding") == "base64":
+        return {
+            "embeddings_b64": base64.b64encode(embeddings.tobytes()).decode("ascii"),
+            "shape": list(embeddings.shape),
+            "dtype": EMBED_WIRE_DTYPE,
+        }, 200
+    return {"embeddings": embeddings.tolist()}, 200
+
+@app.post("/rerank")
+async def rerank(request: fastapi.Request):
+    """{"query": str, "documents": [str]} -> {"scores": [float]}, cross-encoder relevance in document order."""
+    if not RERANK_MODEL:
+        raise fastapi.HTTPException(status_code=503, detail="Reranking is disabled (RERANK_MODEL is empty)")
+    data = await request.json()
+    query_text = data.get("query")
+    documents = data.get("documents", [])
+    if not isinstance(query_text, str) or not query_text.strip():
+        raise fastapi.HTTPException(status_code=400, detail="Invalid input: 'query' must be a non-empty string.")
+    if not documents or not isinstance(documents, list):
+        raise fastapi.HTTPException(status_code=400, detail="Invalid input: 'documents' must be a non-empty list.")
+    if not all(d is None or isinstance(d, str) for d in documents):
+        raise fastapi.HTTPException(status_code=400, detail="Invalid input: every element of 'documents' must be a string.")
+    scores = await asyncio.to_thread(rerank_scores, query_text, [d or "" for d in documents])
+    return {"scores": scores.tolist()}
@@ -8,6 +8,17 @@ const resultsEl = document.getElementById("results");
 const statusEl = document.getElementById("status");
 const healthEl = document.getElementById("health");
 const useAiCheckbox = document.getElementById("useAi");
+const locationTypeSelect = document.getElementById("locationType");
+const minSalaryInput = document.getElementById("minSalary");
+const rankModeSelect = document.getElementById("rankMode");
+
+// structured filters applied by the RAG service before ranking
+function searchFilters() {
+  const filters = {};
+  if (locationTypeSelect.value) filters.location_type = locationTypeSelect.value;
+  if (minSalaryInput.value) filters.min_salary = Number(minSalaryInput.value);
+  return filters;
+}
 
 function setStatus(text, isError = false) {
   statusEl.textContent = text;
@@ -108,14 +119,39 @@ submitJsonBtn.addEventListener("click", async () => {
       jsonValidationStatus.style.color = "crimson";
       return;
     }
-    jsonValidationStatus.textContent = "Upload successful!";
-    jsonValidationStatus.style.color = "green";
+    await trackIngestJob(res, jsonValidationStatus);
   } catch (e) {
     jsonValidationStatus.textContent = "Network error: " + e.message;
     jsonValidationStatus.style.color = "crimson";
   }
 });
 
+// --- Ingest jobs ---
+// Uploads are processed in the background; poll the job until it finishes.
+async function trackIngestJob(res, statusEl) {
+  const payload = await res.json();
+  const job = payload[0].job;
+  statusEl.style.color = "#444";
+  while (true) {
+    const { status, counts, shards, errors } = await (
+      await fetch(`${INGEST_BASE}/jobs/${job.id}`)
+    ).json();
+    const total = shards.total === null ? "?" : shards.total;
+    statusEl.textContent = `Ingesting (${status}): ${shards.done}/${total} chunks, ${counts.rows} rows written, ${counts.skipped} unchanged`;
+    if (status === "succeeded") {
+      statusEl.textContent = `Upload complete: ${counts.added} added, ${counts.updated} updated, ${counts.skipped} unchanged.`;
+      statusEl.style.color = "green";
+      return true;
+    }
+    if (status === "partial" || status === "failed") {
+      statusEl.textContent = `Upload ${status}: ${counts.rows} rows written. ${errors.join("; ")}`;
+      statusEl.style.color = "crimson";
+      return false;
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+}
+
 // --- Form Upload ---
 let formEntries = [];
 function renderFormFields() {
@@ -178,10 +214,10 @@ jobForm.addEventListener("submit", async (e) => {
       formStatus.style.color = "crimson";
       return;
     }
-    formStatus.textContent = "Upload successful!";
-    formStatus.style.color = "green";
-    formEntries = [];
-    renderFormFields();
+    if (await trackIngestJob(res, formStatus)) {
+      formEntries = [];
+      renderFormFields();
+    }
   } catch (e) {
     formStatus.textContent = "Network error: " + e.message;
     formStatus.style.color = "crimson";
@@ -213,9 +249,8 @@ submitExcelBtn.addEventListener("click", async () => {
       excelStatus.style.color = "crimson";
       return;
     }
-    excelStatus.textContent = "Upload successful!";
-    excelStatus.style.color = "green";
     excelFileInput.value = "";
+    await trackIngestJob(res, excelStatus);
   } catch (e) {
     excelStatus.textContent = "Network error: " + e.message;
     excelStatus.style.color = "crimson";
@@ -240,6 +275,11 @@ async function doSearch() {
   setStatus("Searching…");
   resultsEl.innerHTML = "";
 
+  if (useAiCheckbox.checked) {
+    await doStreamingSearch(q, n_results);
+    return;
+  }
+
   // adapt path/body to your RAG API; this assumes POST /search -> {query, use_ai}
   try {
     const res = await fetch(`${API_BASE}/search`, {
@@ -249,6 +289,8 @@ async function doSearch() {
         query: q,
         use_ai: useAiCheckbox.checked,
         n_results,
+        filters: searchFilters(),
+        rank_mode: rankModeSelect.value,
       }),
     });
 
@@ -275,11 +317,82 @@ async function doSearch() {
   }
 }
 
+// POST /search-stream -> server-sent events: results, token*, done (or error)
+async function doStreamingSearch(q, n_results) {
+  try {
+    const res = await fetch(`${API_BASE}/search-stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        query: q,
+        use_ai: true,
+        n_results,
+        filters: searchFilters(),
+        rank_mode: rankModeSelect.value,
+      }),
+    });
+    if (!res.ok) {
+      const txt = await res.text();
+      setStatus(`Server error: ${res.status} ${txt}`, true);
+      return;
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let aiEl = null;
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const frame = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        const event = (frame.match(/^event: (.*)$/m) || [])[1];
+        const data = JSON.parse((frame.match(/^data: (.*)$/m) || [])[1] || "{}");
+        if (event === "results") {
+          const length = data.results.documents[0].length;
+          setStatus(`Got ${length} result(s), ranking with AI…`);
+          displayResults(data.results, length);
+          aiEl = createAiResponse();
+        } else if (event === "token" && aiEl) {
+          aiEl.textContent += data.token;
+        } else if (event === "error") {
+          setStatus(`${data.status}: ${data.error}`, true);
+        } else if (event === "done") {
+          setStatus(
+            `Done in ${data.timings.total_ms} ms (first token ${data.timings.ttft_ms} ms)`
+          );
+        }
+      }
+    }
+  } catch (err) {
+    setStatus("Network error: " + err.message, true);
+  }
+}
+
+function createAiResponse() {
+  const llmDiv = document.createElement("div");
+  llmDiv.style.border = "2px solid #4caf50";
+  llmDiv.style.margin = "12px 0";
+  llmDiv.style.padding = "16px";
+  llmDiv.style.borderRadius = "8px";
+  llmDiv.style.background = "#e8f5e9";
+  llmDiv.innerHTML = `
+    <div style="font-size:1.2em;font-weight:bold;margin-bottom:8px;color:#2e7d32;">AI Summary / Ranking</div>
+    <div><pre style="white-space:pre-wrap;margin:0;"></pre></div>
+  `;
+  resultsEl.appendChild(llmDiv);
+  return llmDiv.querySelector("pre");
+}
+
 function displayResults(results, length, llmResponse) {
   console.log("Display results data:", results);
 
   for (let i = 0; i < length; i++) {
     const distance = results.distances[0][i];
+    const score = results.scores ? results.scores[0][i] : null;
     const text = results.documents[0][i];
     const metadata = results.metadatas[0][i];
     const location = metadata["Job Location"] || "";
@@ -308,6 +421,7 @@ function displayResults(results, length, llmResponse) {
       <div style="display:flex;flex-wrap:wrap;gap:16px;margin-bottom:8px;">
       <div><strong>Salary:</strong> ${salary}</div>
       <div><strong>Distance:</strong> ${distance}</div>
+      ${score !== null ? `<div><strong>Score:</strong> ${score}</div>` : ""}
       </div>
       <div style="margin-bottom:8px;"><strong>Job Roles:</strong> ${jobRoles}</div>
       ${
@@ -342,8 +456,10 @@ qInput.addEventListener("keydown", (e) => {
 const promptInput = document.getElementById("prompt-input");
 const submitPromptBtn = document.getElementById("submit-prompt");
 const llmResponseEl = document.getElementById("llm-response");
+const stopPromptBtn = document.getElementById("stop-prompt");
 let socket = null;
-const LLM_SOCKET_URL = "ws://localhost:7860/generate-stream";
+// v2 protocol: `delta` frames with the new text only; {"type": "stop"} ends generation early
+const LLM_SOCKET_URL = "ws://localhost:7860/v2/generate-stream";
 
 submitPromptBtn.addEventListener("click", async () => {
   const prompt = promptInput.value.trim();
@@ -363,18 +479,27 @@ submitPromptBtn.addEventListener("click", async () => {
 
   socket.onmessage = (event) => {
     const response = JSON.parse(event.data);
-    if (response.type === "token") {
-      appendTokenToResponse(response.token);
+    if (response.type === "delta") {
+      appendTokenToResponse(response.text);
     } else if (response.type === "complete") {
       console.log("Received response:", response);
+      socket.close();
     } else if (response.type === "error") {
-      console.error("Error from LLM:", response.data);
+      console.error("Error from LLM:", response.message);
     }
   };
 
   socket.onclose = () => {
     console.log("WebSocket connection closed");
+    stopPromptBtn.disabled = true;
   };
+  stopPromptBtn.disabled = false;
+});
+
+stopPromptBtn.addEventListener("click", () => {
+  if (socket && socket.readyState === WebSocket.OPEN) {
+    socket.send(JSON.stringify({ type: "stop" }));
+  }
 });
 
 function appendTokenToResponse(token) {
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark for CSV normalization: the vectorized _normalize_csv_frame and
+listing_texts against the previous row-by-row implementation on synthetic exports.
+
+    python benchmark_clean.py                  # 100k and 1M rows
+    python benchmark_clean.py --rows 50000
+
+Also asserts the two implementations produce identical frames and texts.
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from helpers import _normalize_csv_frame, embedColumns, listing_texts, metadataColumns, salaryColumns
+
+
+def synthetic_csv(rows: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp.now().normalize()
+    salaries = np.array(["$18/hr", "$22.50 per hour", "$50,000 - $65,000/yr", "80k-100k a year",
+                         "Competitive", "", "$45,000 per annum", "$15 - $20/hr"])
+    work_models = np.array(["Remote", "Hybrid", "On-site", "Onsite internship", "Full-time", ""])
+    df = pd.DataFrame({
+        "Position Title": np.char.add("Engineer ", rng.integers(0, 1000, rows).astype(str)),
+        "Work Model": rng.choice(work_models, rows),
+        "Company": np.char.add("Company ", rng.integers(0, 5000, rows).astype(str)),
+        "Salary": rng.choice(salaries, rows),
+        "Location": rng.choice(np.array(["Provo, UT", "Remote", "Austin, TX", ""]), rows),
+        "Qualifications": rng.choice(np.array(["python sql", "excel", "react", ""]), rows),
+        "Apply": np.char.add("https://jobs.example.com/", np.arange(rows).astype(str)),
+        "Date": (today - pd.to_timedelta(rng.integers(0, 120, rows), unit="D")).strftime("%Y-%m-%d"),
+    })
+    return df.to_csv(index=False).encode()
+
+
+def legacy_normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """The row-wise apply implementation this benchmark replaced."""
+    df = df.rename(columns={"Position Title": "Title", "Work Model": "Employment Type", "Company": "Employer",
+                            "Salary": "Job Salary", "Location": "Job Location", "Qualifications": "Job Roles",
+                            "Apply": "URL"})
+    if "Date" in df.columns and "Expires" not in df.columns:
+        df["Expires"] = pd.to_datetime(df["Date"], errors="coerce") + pd.Timedelta(days=90)
+    for col in metadataColumns:
+        if col not in df.columns:
+            df[col] = None
+
+    def infer_location_type(val):
+        if pd.isna(val):
+            return None
+        s = str(val).lower()
+        if "remote" in s:
+            return "Remote"
+        if "hybrid" in s:
+            return "Hybrid"
+        if "onsite" in s or "on-site" in s or "on site" in s:
+            return "Onsite"
+        return None
+
+    def infer_salary_type(val):
+        if pd.isna(val):
+            return None
+        s = str(val).lower()
+        if "/yr" in s or "per year" in s or "year" in s or "annum" in s:
+            return "Yearly"
+        if "/hr" in s or "per hour" in s or "hour" in s:
+            return "Hourly"
+        return None
+
+    df["Location Type"] = df.apply(
+        lambda r: r["Location Type"] if pd.notna(r["Location Type"]) else infer_location_type(r.get("Employment Type")),
+        axis=1
+    )
+    df["Salary Type"] = df.apply(
+        lambda r: r["Salary Type"] if pd.notna(r["Salary Type"]) else infer_salary_type(r.get("Job Salary")),
+        axis=1
+    )
+    df["Expires"] = pd.to_datetime(df["Expires"], errors="coerce")
+    df = df.dropna(subset=["Expires"])
+    df = df[df["Expires"] >= pd.Timestamp.now()]
+    return df[[c for c in metadataColumns + ["Expires"] if c in df.columns]]
+
+
+def legacy_texts(df: pd.DataFrame) -> list:
+    return df.apply(lambda row: " ".join(str(row[col]) for col in embedColumns), axis=1).tolist()
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", type=int, default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        raw = pd.read_csv(io.BytesIO(synthetic_csv(rows)))
+        old, old_seconds = timed(legacy_normalize, raw.copy())
+        new, new_seconds = timed(_normalize_csv_frame, raw.copy())
+        old_texts, old_text_seconds = timed(legacy_texts, old)
+        new_texts, new_text_seconds = timed(listing_texts, new)
+
+        pd.testing.assert_frame_equal(old, new.drop(columns=salaryColumns), check_dtype=False)
+        assert old_texts == new_texts, "listing texts differ"
+        parsed = new["Salary Max"].notna().mean()
+        results.append({
+            "rows": rows,
+            "normalize_seconds": {"legacy": round(old_seconds, 3), "vectorized": round(new_seconds, 3)},
+            "texts_seconds": {"legacy": round(old_text_seconds, 3), "vectorized": round(new_text_seconds, 3)},
+            "speedup": round((old_seconds + old_text_seconds) / (new_seconds + new_text_seconds), 1),
+            "salary_parsed_fraction": round(float(parsed), 3),
+        })
+        print(f"{rows:>9} rows: legacy {old_seconds + old_text_seconds:.2f}s, "
+              f"vectorized {new_seconds + new_text_seconds:.2f}s ({results[-1]['speedup']}x), outputs identical")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,67 @@
 import fastapi
 from fastapi import HTTPException
 import pandas as pd
+import numpy as np
 import chromadb
+import requests
+import hashlib
+import re
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Iterator
+from xml.etree.ElementTree import iterparse
+from openpyxl import load_workbook
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
+from openpyxl.xml.constants import REL_NS, SHEET_MAIN_NS
+from clients import Client, replica_urls
+from instrumentation import observe_stage, stage, trace_headers
+from wire import EMBED_WIRE_MEDIA_TYPE, decode_embeddings
+
+CHROMA_HOST = os.getenv("CHROMA_HOST", "chroma")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
+COLLECTION_NAME = "job_listings"
+# rows per upsert request and number of upsert requests kept in flight
+CHROMA_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "500"))
+CHROMA_UPLOAD_CONCURRENCY = int(os.getenv("CHROMA_UPLOAD_CONCURRENCY", "4"))
+# rows per chunk streamed through clean -> embed -> upload for file uploads
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+RAG_URL = os.getenv("RAG_URL", "http://rag:8000")
+# seconds one embed call may take across retries; chunks of INGEST_CHUNK_SIZE texts on CPU can be slow
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "300"))
+# shard workers (each embeds and upserts one shard at a time) and upload jobs run at once
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2"))
+
+# EMBEDDING_URLS (comma separated) spreads chunks over several embed replicas; embed
+# calls come from the shard workers, so keep a connection for each of them per job
+embed = Client(replica_urls("EMBEDDING_URLS", "EMBEDDING_URL", "http://embed:8003/embed", path="/embed"),
+               "embed", timeout=EMBED_TIMEOUT, pool_size=INGEST_WORKERS * INGEST_MAX_CONCURRENT_JOBS)
 
 embedColumns = ["Title", "Employment Type"]
 metadataColumns = ["Title", "Employment Type", "Employer", "Job Salary", "Salary Type", "Job Location", "Location Type", "Job Roles", "URL"]
+salaryColumns = ["Salary Min", "Salary Max"]
+# "$50,000", "18.50", "80k", optionally followed by "- $65,000" / "to 100k" and a "/hr", "per month" unit
+SALARY_PATTERN = (r"(\d[\d,]*(?:\.\d+)?)\s*([kK])?(?:\s*(?:-|–|to)\s*\$?\s*(\d[\d,]*(?:\.\d+)?)\s*([kK])?)?"
+                  r"(?:\s*(?:/|per\b|an?\b)\s*(hour|hr|week|wk|month|mo|year|yr|annum))?")
+# pay periods (canonical Salary Type) and what one of them is worth per year
+ANNUAL_FACTORS = {"Hourly": 2080, "Weekly": 52, "Monthly": 12, "Yearly": 1}
+# JSON listings without an Expires date get the same 90-day lifetime as CSV postings
+DEFAULT_LISTING_DAYS = int(os.getenv("DEFAULT_LISTING_DAYS", "90"))
+# set on listings whose Expires was defaulted at upload; such an Expires changes with every
+# upload, so it is left out of the listing's ID and fingerprint
+EXPIRES_DEFAULTED = "Expires Defaulted"
+# collection metadata flag set once backfill_expires has dated every stored listing
+EXPIRES_BACKFILLED = "expires_backfilled"
+# canonical Location Type / Salary Type values, matched by substring in this order
+LOCATION_TYPES = [("remote", "Remote"), ("hybrid", "Hybrid"), ("onsite", "Onsite"), ("on-site", "Onsite"),
+                  ("on site", "Onsite"), ("in person", "Onsite"), ("in-person", "Onsite")]
+SALARY_TYPES = [("hour", "Hourly"), ("/hr", "Hourly"), ("week", "Weekly"), ("/wk", "Weekly"),
+                ("month", "Monthly"), ("/mo", "Monthly"), ("year", "Yearly"), ("annum", "Yearly"),
+                ("annual", "Yearly"), ("/yr", "Yearly")]
+# bumped when the stored metadata format changes so incremental uploads rewrite old rows
+METADATA_VERSION = 3
+EPOCH = pd.Timestamp("1970-01-01")
 # embedColumnsRename = ["Position Title", "Qualifications"]
 # metadataColumnsRename = ["Position Title", "Qualifications", "Employer", "Salary", "Salary Type", "Location", "Location Type", "URL"]
 # use pandas to process the Excel data
@@ -12,22 +69,91 @@ metadataColumns = ["Title", "Employment Type", "Employer", "Job Salary", "Salary
 # Title,Employment Type,Employer,Expires,Job Salary,Salary Type,Job Location,Location Type,Residential Address,Job Roles
 def clean_data(file: fastapi.UploadFile) -> pd.DataFrame:
     # this works for BYU handshake job lists
+    return pd.concat(list(iter_excel_chunks(file.file)), ignore_index=True)
+
+def iter_excel_chunks(source: BinaryIO, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream an Excel file as cleaned DataFrames of at most chunk_size rows.
+
+    Rows are read once through openpyxl's read-only mode. Read-only worksheets
+    don't expose hyperlinks, and xlsx stores them after the cell data, so the
+    column A links are collected up front by a lightweight scan of the sheet XML.
+    """
+    try:
+        source.seek(0)
+        workbook = load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
     try:
-        df = pd.read_excel(file.file)
-        file.file.seek(0)  # Reset file pointer to beginning
-        from openpyxl import load_workbook
-        workbook = load_workbook(file.file)
         sheet = workbook.active
-        # Skip the header row (index 0) since pd.read_excel already handles headers
-        urls = [cell.hyperlink.target if cell.hyperlink else None for cell in sheet['A'][1:]]
-        df["URL"] = urls
+        with stage("parse"):
+            urls = _column_a_hyperlinks(workbook, sheet)
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)] + ["URL"]
+        buffer = []
+        # parse time is measured per chunk, excluding the time the consumer holds each yielded chunk
+        parse_started = time.perf_counter()
+        for row_number, values in enumerate(rows, start=2):
+            if all(v is None for v in values):
+                continue
+            buffer.append(tuple(values) + (urls.get(row_number),))
+            if len(buffer) >= chunk_size:
+                yield _excel_chunk(buffer, columns, parse_started)
+                buffer = []
+                parse_started = time.perf_counter()
+        if buffer:
+            yield _excel_chunk(buffer, columns, parse_started)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
-    # Example cleaning steps
+    finally:
+        workbook.close()
+
+def _column_a_hyperlinks(workbook, sheet) -> dict[int, str]:
+    """Map row number -> external hyperlink target for cells in column A."""
+    archive = workbook._archive
+    sheet_path = sheet._worksheet_path
+    rels_path = get_rels_path(sheet_path)
+    if rels_path not in archive.namelist():
+        return {}
+    targets = {rel.id: rel.target for rel in get_dependents(archive, rels_path)}
+    links = {}
+    sheet_data = None
+    with archive.open(sheet_path) as src:
+        for event, element in iterparse(src, events=("start", "end")):
+            if event == "start":
+                if element.tag == f"{{{SHEET_MAIN_NS}}}sheetData":
+                    sheet_data = element
+            elif element.tag == f"{{{SHEET_MAIN_NS}}}row" and sheet_data is not None:
+                sheet_data.clear()  # cell data is read by the row pass; keep the scan flat
+            elif element.tag == f"{{{SHEET_MAIN_NS}}}hyperlink":
+                ref = element.get("ref", "").split(":")[0]
+                target = targets.get(element.get(f"{{{REL_NS}}}id"))
+                if target and ref[:1] == "A" and ref[1:].isdigit():
+                    links[int(ref[1:])] = target
+    return links
+
+def _excel_chunk(rows: list, columns: list, parse_started: float) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=columns)
+    observe_stage("parse", time.perf_counter() - parse_started)
+    with stage("clean"):
+        return _clean_excel_frame(df)
+
+def _clean_excel_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = add_salary_range(df)
     df['Expires'] = pd.to_datetime(df['Expires'], errors='coerce')  # Convert to datetime, coerce errors
     df = df.dropna(subset=['Expires'])  # Drop rows where 'Expires' could not be converted
-    df = df[df['Expires'] >= pd.Timestamp.now()]  # Keep only rows where 'Expires' is in the future
-    return df
+    return _drop_expired(df)
+
+def _drop_expired(df: pd.DataFrame) -> pd.DataFrame:
+    # Keep only rows where 'Expires' is in the future; the count is reported by ingest
+    live = df[df['Expires'] >= pd.Timestamp.now()]
+    live.attrs["expired_rows"] = len(df) - len(live)
+    return live
 
 def clean_csv_data(file: fastapi.UploadFile) -> pd.DataFrame:
     """
@@ -45,12 +171,29 @@ def clean_csv_data(file: fastapi.UploadFile) -> pd.DataFrame:
       - "Apply" -> "URL"
       - "Date" -> used to compute an "Expires" column (Date + 90 days)
     """
+    return pd.concat(list(iter_csv_chunks(file.file)), ignore_index=True)
+
+def iter_csv_chunks(source: BinaryIO, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Stream a CSV file as normalized DataFrames of at most chunk_size rows."""
     try:
-        file.file.seek(0)
-        df = pd.read_csv(file.file)
+        source.seek(0)
+        reader = pd.read_csv(source, chunksize=chunk_size)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read CSV file: {str(e)}")
+    with reader:
+        while True:
+            try:
+                with stage("parse"):
+                    df = next(reader, None)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Failed to read CSV file: {str(e)}")
+            if df is None:
+                return
+            with stage("clean"):
+                df = _normalize_csv_frame(df)
+            yield df
 
+def _normalize_csv_frame(df: pd.DataFrame) -> pd.DataFrame:
     # canonical target columns expected elsewhere in the pipeline
     target_cols = set(metadataColumns + ["Expires"])
 
@@ -93,78 +236,378 @@ def clean_csv_data(file: fastapi.UploadFile) -> pd.DataFrame:
             df[col] = None
 
     # Infer Location Type from Employment Type / Work Model content if possible
-    if "Employment Type" in df.columns:
-        def infer_location_type(val):
-            if pd.isna(val):
-                return None
-            s = str(val).lower()
-            if "remote" in s:
-                return "Remote"
-            if "hybrid" in s:
-                return "Hybrid"
-            if "onsite" in s or "on-site" in s or "on site" in s:
-                return "Onsite"
-            return None
-        df["Location Type"] = df.get("Location Type", None)
-        df["Location Type"] = df.apply(
-            lambda r: r["Location Type"] if pd.notna(r["Location Type"]) else infer_location_type(r.get("Employment Type")),
-            axis=1
-        )
+    employment = df["Employment Type"].astype(str).str.lower()
+    inferred = np.select(
+        [
+            employment.str.contains("remote", regex=False),
+            employment.str.contains("hybrid", regex=False),
+            employment.str.contains("onsite|on-site|on site", regex=True),
+        ],
+        ["Remote", "Hybrid", "Onsite"],
+        default=None,
+    )
+    df["Location Type"] = df["Location Type"].where(df["Location Type"].notna(), pd.Series(inferred, index=df.index))
 
     # Infer Salary Type from Job Salary string when possible
-    if "Job Salary" in df.columns:
-        def infer_salary_type(val):
-            if pd.isna(val):
-                return None
-            s = str(val).lower()
-            if "/yr" in s or "per year" in s or "year" in s or "annum" in s:
-                return "Yearly"
-            if "/hr" in s or "per hour" in s or "hour" in s:
-                return "Hourly"
-            return None
-        df["Salary Type"] = df.get("Salary Type", None)
-        df["Salary Type"] = df.apply(
-            lambda r: r["Salary Type"] if pd.notna(r["Salary Type"]) else infer_salary_type(r.get("Job Salary")),
-            axis=1
-        )
+    df["Salary Type"] = df["Salary Type"].where(df["Salary Type"].notna(), pay_period(df["Job Salary"]))
+    df = add_salary_range(df)
 
     # Final cleaning: parse Expires, drop rows without Expires (consistent with Excel handler)
     df["Expires"] = pd.to_datetime(df["Expires"], errors="coerce")
     df = df.dropna(subset=["Expires"])
-    df = df[df["Expires"] >= pd.Timestamp.now()]
+    df = _drop_expired(df)
 
-    # Keep only canonical columns (plus Expires) in a stable order
-    out_cols = metadataColumns + ["Expires"]
+    # Keep only canonical columns (plus Expires and the parsed salary range) in a stable order
+    out_cols = metadataColumns + ["Expires"] + salaryColumns
+    expired_rows = df.attrs.get("expired_rows", 0)
     df = df[[c for c in out_cols if c in df.columns]]
+    df.attrs["expired_rows"] = expired_rows
 
     return df
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    """Get embeddings for a list of texts using embed container."""
-    import os
-    import requests
-
-    url = os.getenv("EMBEDDING_URL", "http://embed:8003/embed")
-    resp = requests.post(url, json={"texts": texts})
-    resp.raise_for_status()
-    return resp.json()[0]["embeddings"]
-
-def upload_to_chroma(embeddings: list[list[float]], texts: list[str], metadata: list[dict]):
-    """Upload embeddings and texts to ChromaDB."""
-    
-    client = chromadb.HttpClient(host="chroma", port=8001)
-    collection = client.get_or_create_collection(name="job_listings")
-    metadata = [{k: str(v) for k, v in meta.items()} for meta in metadata]
-
-    for idx, (text, embedding, meta) in enumerate(zip(texts, embeddings, metadata)):
-        doc_id = f"job-{idx}"
-        document = {
-            "text": text,
-            "metadata": meta
-        }
-        collection.add(
-            documents=[document["text"]],
-            metadatas=[document["metadata"]],
-            ids=[doc_id],
-            embeddings=[embedding]
-        )
\ No newline at end of file
+def _extract_salary(salary: pd.Series) -> pd.DataFrame:
+    """SALARY_PATTERN groups for each string, preferring the $-prefixed amount ("20 hrs/week at $15/hr" -> 15/hr)."""
+    text = salary.astype(str)
+    parts = text.str.extract(r"\$\s*" + SALARY_PATTERN, flags=re.IGNORECASE)
+    unanchored = parts[0].isna()
+    parts.loc[unanchored] = text[unanchored].str.extract(SALARY_PATTERN, flags=re.IGNORECASE)
+    return parts
+
+def _salary_types(values: pd.Series) -> pd.Series:
+    return values.map(lambda v: normalize_choice(v, SALARY_TYPES), na_action="ignore")
+
+def pay_period(salary: pd.Series) -> pd.Series:
+    """Canonical Salary Type of each "Job Salary" string: the amount's own unit, else any period it mentions."""
+    unit = _salary_types("/" + _extract_salary(salary)[4])
+    return unit.where(unit.notna(), _salary_types(salary))
+
+def add_salary_range(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse "Job Salary" strings such as "$18/hr", "$50,000 - $65,000", "80k-100k" or
+    "$1,500/month" into numeric "Salary Min"/"Salary Max" columns, annualized for
+    hourly, weekly and monthly pay.
+    """
+    if "Job Salary" not in df.columns:
+        df[salaryColumns] = np.nan
+        return df
+    parts = _extract_salary(df["Job Salary"])
+    low = pd.to_numeric(parts[0].str.replace(",", "", regex=False), errors="coerce")
+    high = pd.to_numeric(parts[2].str.replace(",", "", regex=False), errors="coerce")
+    # "80-100k": a bare lower bound shares the upper bound's thousands suffix
+    low_k = parts[1].notna() | (parts[3].notna() & (low < 1000))
+    low = low * np.where(low_k, 1000, 1)
+    high = (high * np.where(parts[3].notna(), 1000, 1)).fillna(low)
+    # the unit next to the amount wins, then Salary Type, then any period the salary text mentions
+    period = _salary_types("/" + parts[4])
+    if "Salary Type" in df.columns:
+        period = period.where(period.notna(), _salary_types(df["Salary Type"]))
+    period = period.where(period.notna(), _salary_types(df["Job Salary"]))
+    factor = period.map(ANNUAL_FACTORS).fillna(1).to_numpy()
+    df["Salary Min"] = low * factor
+    df["Salary Max"] = high * factor
+    return df
+
+def listing_texts(df: pd.DataFrame) -> list[str]:
+    """Text that gets embedded for each listing row."""
+    texts = _as_str(df[embedColumns[0]])
+    for col in embedColumns[1:]:
+        texts = texts + " " + _as_str(df[col])
+    return texts.tolist()
+
+def _as_str(values: pd.Series) -> pd.Series:
+    # same text as str(value); missing values keep their "nan"/"None" spelling
+    strings = values.astype(str).astype(object)
+    missing = values.isna()
+    if missing.any():
+        strings[missing] = values[missing].map(str)
+    return strings
+
+def listing_metadata(df: pd.DataFrame) -> list[dict]:
+    """Chroma metadata for each row, with Expires as epoch seconds and the annualized salary range."""
+    columns = metadataColumns + [c for c in salaryColumns if c in df.columns]
+    metadata = df[columns].to_dict(orient="records")
+    for meta, expires in zip(metadata, epoch_seconds(df["Expires"])):
+        meta["Expires"] = expires
+    return metadata
+
+def json_metadata(items: list[dict]) -> list[dict]:
+    """
+    Metadata for uploaded JSON listings, typed like file uploads: salary ranges are
+    parsed from "Job Salary" unless given, and Expires becomes epoch seconds,
+    defaulting to DEFAULT_LISTING_DAYS from now.
+    """
+    df = add_salary_range(pd.DataFrame(items))
+    default_expires = now_epoch() + DEFAULT_LISTING_DAYS * 86400
+    expires = pd.to_datetime(df["Expires"], errors="coerce") if "Expires" in df.columns else pd.Series(pd.NaT, index=df.index)
+    metadata = []
+    for item, low, high, expiry in zip(items, df["Salary Min"], df["Salary Max"], expires):
+        meta = {"source": "json_upload", **item}
+        if _missing(meta.get("Salary Min")):
+            meta["Salary Min"] = low
+        if _missing(meta.get("Salary Max")):
+            meta["Salary Max"] = high
+        if pd.isna(expiry):
+            meta["Expires"] = default_expires
+            meta[EXPIRES_DEFAULTED] = True
+        else:
+            meta["Expires"] = int((expiry - EPOCH) // pd.Timedelta(seconds=1))
+        metadata.append(meta)
+    return metadata
+
+def epoch_seconds(timestamps: pd.Series) -> list[int]:
+    return ((pd.to_datetime(timestamps) - EPOCH) // pd.Timedelta(seconds=1)).astype("int64").tolist()
+
+def now_epoch() -> int:
+    # same naive wall clock the upload-time expiry filter compares against
+    return int((pd.Timestamp.now() - EPOCH) // pd.Timedelta(seconds=1))
+
+def frame_shards(chunks: Iterable[pd.DataFrame]) -> Iterator[tuple]:
+    """(texts, metadata, expired_rows) for each cleaned chunk, the unit of work for ingest jobs."""
+    for df in chunks:
+        with stage("clean"):
+            shard = listing_texts(df), listing_metadata(df), df.attrs.get("expired_rows", 0)
+        yield shard
+
+def ingest_shard(texts: list[str], metadata: list[dict], incremental: bool = True) -> dict:
+    """Fingerprint, embed and upsert one shard; the unit of work retried by ingest jobs."""
+    ids, texts, metadata, counts = plan_upsert(texts, metadata, incremental)
+    counts["rows"] = 0
+    if ids:
+        embeddings = embed_texts(texts)
+        with stage("chroma_upsert"):
+            counts["rows"] = upload_to_chroma(embeddings, texts, metadata, ids)["rows"]
+    counts["ids"] = ids
+    return counts
+
+def plan_upsert(texts: list[str], metadata: list[dict], incremental: bool = True):
+    """
+    Fingerprint each listing and compare with what Chroma already stores under the
+    same ID. Returns the ids, texts and metadata to write plus per-outcome counts.
+    """
+    rows = {}
+    for text, meta in zip(texts, metadata):
+        meta = chroma_metadata(meta)
+        doc_id = listing_id(text, meta)
+        meta["Fingerprint"] = listing_fingerprint(text, meta)
+        rows[doc_id] = (text, meta)
+    counts = {"added": 0, "updated": 0, "skipped": 0, "duplicates": len(texts) - len(rows)}
+
+    with stage("chroma_get"):
+        existing = existing_fingerprints(list(rows))
+    ids, out_texts, out_metadata = [], [], []
+    for doc_id, (text, meta) in rows.items():
+        if doc_id not in existing:
+            counts["added"] += 1
+        elif existing[doc_id] == meta["Fingerprint"] and incremental:
+            counts["skipped"] += 1
+            continue
+        else:
+            counts["updated"] += 1
+        ids.append(doc_id)
+        out_texts.append(text)
+        out_metadata.append(meta)
+    return ids, out_texts, out_metadata, counts
+
+def existing_fingerprints(ids: list[str]) -> dict:
+    collection = get_collection()
+    fingerprints = {}
+    for i in range(0, len(ids), CHROMA_BATCH_SIZE):
+        found = collection.get(ids=ids[i:i + CHROMA_BATCH_SIZE], include=["metadatas"])
+        for doc_id, meta in zip(found["ids"], found["metadatas"]):
+            fingerprints[doc_id] = (meta or {}).get("Fingerprint")
+    return fingerprints
+
+def sweep_expired() -> dict:
+    """Delete listings whose Expires has passed, CHROMA_BATCH_SIZE IDs at a time."""
+    start = time.perf_counter()
+    collection = get_collection()
+    cutoff = now_epoch()
+    expired = 0
+    while True:
+        found = collection.get(where={"Expires": {"$lt": cutoff}}, limit=CHROMA_BATCH_SIZE, include=[])
+        if not found["ids"]:
+            break
+        collection.delete(ids=found["ids"])
+        notify_rag(deleted=found["ids"])
+        expired += len(found["ids"])
+    observe_stage("expiry_sweep", time.perf_counter() - start)
+    stats = {"expired": expired, "cutoff": cutoff, "seconds": round(time.perf_counter() - start, 3)}
+    print(f"Expiry sweep removed {expired} listings")
+    return stats
+
+def backfill_expires() -> int:
+    """
+    One-time migration for listings stored before Expires was typed: give every
+    row without a numeric Expires one (its old date string when it parses, else
+    DEFAULT_LISTING_DAYS from now) so search's expiry filter and the sweep see it.
+    Returns the number of listings updated. Once a pass completes the collection is
+    flagged, so later startups skip the scan.
+    """
+    collection = get_collection()
+    collection_metadata = dict(collection.metadata or {})
+    if collection_metadata.get(EXPIRES_BACKFILLED):
+        return 0
+    default_expires = now_epoch() + DEFAULT_LISTING_DAYS * 86400
+    updated, offset = 0, 0
+    while True:
+        found = collection.get(limit=CHROMA_BATCH_SIZE, offset=offset, include=["metadatas"])
+        if not found["ids"]:
+            break
+        offset += len(found["ids"])
+        ids, metadatas = [], []
+        for doc_id, meta in zip(found["ids"], found["metadatas"]):
+            meta = dict(meta or {})
+            expires = meta.get("Expires")
+            if isinstance(expires, (int, float)) and not isinstance(expires, bool):
+                continue
+            parsed = pd.to_datetime(expires, errors="coerce") if expires is not None else pd.NaT
+            if pd.isna(parsed):
+                meta["Expires"] = default_expires
+                meta[EXPIRES_DEFAULTED] = True
+            else:
+                meta["Expires"] = int((parsed - EPOCH) // pd.Timedelta(seconds=1))
+            ids.append(doc_id)
+            metadatas.append(meta)
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            notify_rag(upserted=ids)
+            updated += len(ids)
+    # Chroma rejects hnsw:* keys in modify(); they can't change after creation anyway
+    collection_metadata = {k: v for k, v in collection_metadata.items() if not k.startswith("hnsw:")}
+    collection.modify(metadata={**collection_metadata, EXPIRES_BACKFILLED: True})
+    print(f"Backfilled Expires on {updated} listings")
+    return updated
+
+def notify_rag(upserted: list[str] = (), deleted: list[str] = ()):
+    """Tell the rag service which listings changed so it updates its lexical index and drops cached searches."""
+    try:
+        changes = {"upserted": list(upserted), "deleted": list(deleted)}
+        requests.post(f"{RAG_URL}/cache/invalidate", json=changes, headers=trace_headers(), timeout=5).raise_for_status()
+    except Exception as e:
+        # cached searches still expire on their TTL if the hook is missed
+        print(f"Failed to notify rag of new listings: {e}")
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Get embeddings for a list of texts using embed container, as a (n, dim) float32 array."""
+    with stage("embed"):
+        resp = embed.post("/embed", json={"texts": texts}, headers={"Accept": EMBED_WIRE_MEDIA_TYPE, **trace_headers()})
+        resp.raise_for_status()
+        return decode_embeddings(resp)
+
+def chroma_metadata(meta: dict) -> dict:
+    """
+    Typed Chroma metadata so rag can filter with `where` clauses: numbers stay
+    numeric, Location Type / Salary Type are normalized to fixed values, and
+    missing values are left out rather than stored as "nan".
+    """
+    out = {}
+    for key, value in meta.items():
+        if _missing(value):
+            continue
+        if key == "Location Type":
+            value = normalize_choice(value, LOCATION_TYPES)
+        elif key == "Salary Type":
+            value = normalize_choice(value, SALARY_TYPES)
+        elif key in salaryColumns:
+            value = _number(value)
+        elif isinstance(value, (bool, int, float, np.number, np.bool_)):
+            value = value.item() if isinstance(value, np.generic) else value
+            if isinstance(value, float) and not np.isfinite(value):
+                value = None
+        else:
+            value = str(value)
+        if value is not None:
+            out[key] = value
+    return out
+
+def normalize_choice(value, choices: list[tuple]) -> str | None:
+    text = str(value).strip().lower()
+    for needle, canonical in choices:
+        if needle in text:
+            return canonical
+    return None
+
+def _number(value) -> float | None:
+    try:
+        number = float(str(value).replace(",", "").replace("$", ""))
+    except ValueError:
+        return None
+    return round(number, 2) if np.isfinite(number) else None
+
+def _missing(value) -> bool:
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return True
+    return isinstance(value, str) and value.strip().lower() in ("", "nan", "none", "nat")
+
+def listing_id(text: str, meta: dict) -> str:
+    """
+    Stable document ID for a listing. The apply URL identifies a posting when we
+    have one; otherwise fall back to a hash of the listing content so that
+    re-uploading the same export upserts instead of colliding with other rows.
+    """
+    url = meta.get("URL")
+    if isinstance(url, str) and url.strip() and url.strip() not in ("nan", "None"):
+        key = "url:" + url.strip()
+    else:
+        key = "content:" + _content_key(text, meta)
+    return "job-" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def listing_fingerprint(text: str, meta: dict) -> str:
+    """Hash of everything stored for a listing, used to detect changed rows."""
+    return hashlib.sha1(f"v{METADATA_VERSION}|{_content_key(text, meta)}".encode("utf-8")).hexdigest()
+
+def _content_key(text: str, meta: dict) -> str:
+    skip = {"Fingerprint", "Expires"} if meta.get(EXPIRES_DEFAULTED) else {"Fingerprint"}
+    return text + "|" + "|".join(f"{k}={meta[k]}" for k in sorted(meta) if k not in skip)
+
+_collection = None
+
+def get_collection():
+    # reused across chunks of a streamed upload instead of reconnecting per call
+    global _collection
+    if _collection is None:
+        client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+        _collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    return _collection
+
+def upload_to_chroma(embeddings: np.ndarray, texts: list[str], metadata: list[dict], ids: list[str] | None = None) -> dict:
+    """
+    Upsert embeddings and texts to ChromaDB in batches of CHROMA_BATCH_SIZE, keeping
+    up to CHROMA_UPLOAD_CONCURRENCY batches in flight. Returns upload stats.
+    """
+    start = time.perf_counter()
+    collection = get_collection()
+    metadata = [chroma_metadata(meta) for meta in metadata]
+    if ids is None:
+        ids = [listing_id(text, meta) for text, meta in zip(texts, metadata)]
+
+    # Chroma rejects duplicate IDs within one upsert; the last occurrence wins
+    rows = {}
+    for doc_id, text, embedding, meta in zip(ids, texts, embeddings, metadata):
+        rows[doc_id] = (text, embedding, meta)
+    rows = list(rows.items())
+
+    def upsert_batch(batch):
+        collection.upsert(
+            ids=[doc_id for doc_id, _ in batch],
+            documents=[row[0] for _, row in batch],
+            embeddings=[row[1] for _, row in batch],
+            metadatas=[row[2] for _, row in batch],
+        )
+        return len(batch)
+
+    batches = [rows[i:i + CHROMA_BATCH_SIZE] for i in range(0, len(rows), CHROMA_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=CHROMA_UPLOAD_CONCURRENCY) as pool:
+        uploaded = sum(pool.map(upsert_batch, batches))
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "rows": uploaded,
+        "duplicates": len(ids) - uploaded,
+        "batches": len(batches),
+        "batch_size": CHROMA_BATCH_SIZE,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(uploaded / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(f"Uploaded {uploaded} rows to Chroma in {len(batches)} batches: {stats['rows_per_sec']} rows/sec")
+    return stats
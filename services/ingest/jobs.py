@@ -0,0 +1,216 @@
+import contextvars
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from fastapi import HTTPException
+
+from helpers import ingest_shard, notify_rag
+from instrumentation import current_trace_id
+
+
+class Job:
+    """Progress of one upload; updated by shard workers, read by GET /jobs/{id}."""
+
+    def __init__(self, kind: str, source: str):
+        self.id = uuid.uuid4().hex
+        # trace of the upload request; shard embed/upsert calls carry it to the other services
+        self.trace_id = current_trace_id()
+        self.kind = kind
+        self.source = source
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.parsing_done = False
+        self.shards_total = 0
+        self.shards_done = 0
+        self.shards_failed = 0
+        self.retries = 0
+        self.counts = {"rows": 0, "added": 0, "updated": 0, "skipped": 0, "expired": 0, "duplicates": 0}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    # every field is written by the job's driver or shard workers and read by status
+    # requests, so all changes go through these methods under _lock
+
+    def start(self):
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+
+    def parsed_shard(self, expired: int, queued: bool):
+        with self._lock:
+            self.counts["expired"] += expired
+            if queued:
+                self.shards_total += 1
+
+    def parsed(self):
+        with self._lock:
+            self.parsing_done = True
+
+    def record_error(self, error: str):
+        with self._lock:
+            self.errors.append(error)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self) -> str:
+        with self._lock:
+            self.finished_at = time.time()
+            if not self.errors:
+                self.status = "succeeded"
+            elif self.parsing_done and self.shards_done:
+                self.status = "partial"
+            else:
+                self.status = "failed"
+            return self.status
+
+    def is_active(self) -> bool:
+        with self._lock:
+            return self.status in ("queued", "running")
+
+    def record_shard(self, stats: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            if error is None:
+                self.shards_done += 1
+                for key in self.counts:
+                    self.counts[key] += stats.get(key, 0)
+            else:
+                self.shards_failed += 1
+                self.errors.append(error)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0
+            processed = self.counts["rows"] + self.counts["skipped"]
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "source": self.source,
+                "status": self.status,
+                "trace_id": self.trace_id,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "shards": {
+                    "total": self.shards_total if self.parsing_done else None,
+                    "queued": self.shards_total,
+                    "done": self.shards_done,
+                    "failed": self.shards_failed,
+                },
+                "progress": round(self.shards_done / self.shards_total, 4) if self.parsing_done and self.shards_total else None,
+                "counts": dict(self.counts),
+                "retries": self.retries,
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(processed / elapsed, 1) if elapsed > 0 else None,
+                "errors": list(self.errors),
+            }
+
+
+class JobManager:
+    """
+    Runs uploads in the background. Each job's parser yields shards of
+    (texts, metadata, expired_rows); shards are embedded and upserted by a bounded
+    worker pool, with at most 2 * workers shards read ahead so memory stays flat.
+    Transient embed/Chroma failures are retried with exponential backoff and jitter.
+    Beyond max_concurrent_jobs running and max_queued_jobs waiting, uploads are
+    turned away with a 503; only finished jobs are dropped from the history.
+    """
+
+    def __init__(self, workers: int = 4, max_concurrent_jobs: int = 2, max_retries: int = 3,
+                 retry_base_seconds: float = 0.5, history: int = 100, max_queued_jobs: int = 8):
+        self.workers = workers
+        self.max_jobs = max_concurrent_jobs + max_queued_jobs
+        self.max_retries = max_retries
+        self.retry_base = retry_base_seconds
+        self.history = history
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._drivers = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="ingest-job")
+        self._shards = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-shard")
+
+    def submit(self, kind: str, source: str, shards: Callable[[], Iterable[tuple]], incremental: bool = True,
+               cleanup: Optional[Callable[[], None]] = None) -> Job:
+        job = Job(kind, source)
+        with self._jobs_lock:
+            full = sum(1 for other in self._jobs.values() if other.is_active()) >= self.max_jobs
+            if not full:
+                self._jobs[job.id] = job
+                finished = [job_id for job_id, other in self._jobs.items() if not other.is_active()]
+                for job_id in finished[:max(len(self._jobs) - self.history, 0)]:
+                    del self._jobs[job_id]
+        if full:
+            if cleanup is not None:
+                cleanup()
+            raise HTTPException(status_code=503, detail="Too many ingest jobs queued, retry later",
+                                headers={"Retry-After": "5"})
+        self._drivers.submit(contextvars.copy_context().run, self._run, job, shards, incremental, cleanup)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def active(self) -> int:
+        with self._jobs_lock:
+            return sum(1 for job in self._jobs.values() if job.is_active())
+
+    def list(self) -> list:
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def _run(self, job: Job, shards: Callable[[], Iterable[tuple]], incremental: bool, cleanup):
+        job.start()
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        futures = []
+        try:
+            for texts, metadata, expired in shards():
+                if not texts:
+                    job.parsed_shard(expired, queued=False)
+                    continue
+                in_flight.acquire()
+                future = self._shards.submit(contextvars.copy_context().run, self._process_shard,
+                                             job, texts, metadata, incremental)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+                job.parsed_shard(expired, queued=True)
+            job.parsed()
+        except HTTPException as e:
+            job.record_error(e.detail)
+        except Exception as e:
+            job.record_error(f"Failed to read upload: {e}")
+        finally:
+            for future in futures:
+                future.result()
+            if cleanup is not None:
+                cleanup()
+
+        status = job.finish()
+        print(f"Ingest job {job.id} {status} trace={job.trace_id}: {job.to_dict()['counts']}")
+
+    def _process_shard(self, job: Job, texts: list, metadata: list, incremental: bool):
+        for attempt in range(self.max_retries + 1):
+            try:
+                stats = ingest_shard(texts, metadata, incremental)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    job.record_shard(error=f"Shard of {len(texts)} rows failed after {attempt + 1} attempts: {e}")
+                    return
+                job.record_retry()
+                delay = self.retry_base * 2 ** attempt
+                time.sleep(delay + random.uniform(0, delay))
+                continue
+            # rag indexes each shard as soon as it lands rather than once the whole job is done
+            if stats["ids"]:
+                notify_rag(upserted=stats["ids"])
+            job.record_shard(stats)
+            return
@@ -2,14 +2,17 @@ import fastapi
 from fastapi import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import pandas as pd
-from helpers import embed_texts, clean_data, clean_csv_data, upload_to_chroma, embedColumns, metadataColumns
+import asyncio
+import os
+import shutil
+import tempfile
+from helpers import iter_excel_chunks, iter_csv_chunks, frame_shards, listing_texts, json_metadata, sweep_expired, backfill_expires, get_collection, embed, INGEST_CHUNK_SIZE, INGEST_WORKERS, INGEST_MAX_CONCURRENT_JOBS
+from jobs import JobManager
+from instrumentation import gauge, instrument
+from startup import Startup, attach_debugger, readiness
 
-
-# For debugging
-import debugpy
-debugpy.listen(("0.0.0.0", 5679))  # Use a unique port per service if debugging all at once
-print("Waiting for debugger attach...")
-# debugpy.wait_for_client()  # Optional: pause until debugger attaches
+attach_debugger(5679)
+startup = Startup("ingest")
 
 app = fastapi.FastAPI()
 app.add_middleware(
@@ -18,49 +21,116 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
+)
+instrument(app, "ingest")
+readiness(app, startup)
+
+# seconds between expiry sweeps of the job_listings collection; 0 disables the sweeper
+EXPIRY_SWEEP_INTERVAL = float(os.getenv("EXPIRY_SWEEP_INTERVAL", "3600"))
+last_sweep = None
+
+jobs = JobManager(
+    workers=INGEST_WORKERS,
+    max_concurrent_jobs=INGEST_MAX_CONCURRENT_JOBS,
+    max_retries=int(os.getenv("INGEST_MAX_RETRIES", "3")),
+    # uploads waiting for a job slot before new ones get a 503
+    max_queued_jobs=int(os.getenv("INGEST_MAX_QUEUED_JOBS", "8")),
 )
+gauge("ingest_jobs_active", "Ingest jobs queued or running", jobs.active)
+
+async def expiry_sweeper():
+    # started by boot() once Chroma is reachable; a failed sweep is retried soon
+    global last_sweep
+    while True:
+        try:
+            last_sweep = await asyncio.to_thread(sweep_expired)
+        except Exception as e:
+            print(f"Expiry sweep failed ({e}), retrying in 30s")
+            await asyncio.sleep(min(30, EXPIRY_SWEEP_INTERVAL))
+            continue
+        await asyncio.sleep(EXPIRY_SWEEP_INTERVAL)
+
+async def boot():
+    # ready once the listings collection is reachable; Chroma may still be starting
+    while True:
+        try:
+            await startup.step("chroma", get_collection)
+            break
+        except Exception:
+            await asyncio.sleep(5)
+    startup.mark_ready()
+    try:
+        # listings stored before Expires was typed would otherwise be hidden by search's expiry filter
+        await asyncio.to_thread(backfill_expires)
+    except Exception as e:
+        print(f"Expires backfill failed: {e}")
+    if EXPIRY_SWEEP_INTERVAL > 0:
+        await expiry_sweeper()
+
+@app.on_event("startup")
+async def start_boot():
+    asyncio.get_running_loop().create_task(boot())
 
 @app.get("/health")
 def health():
     return {"status": "Ingest service is healthy"}, 200
 
+@app.get("/stats")
+def stats():
+    return {"last_sweep": last_sweep, "startup": startup.status(), "upstreams": {"embed": embed.stats()}}
+
+@app.post("/sweep-expired")
+def sweep():
+    global last_sweep
+    try:
+        last_sweep = sweep_expired()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error sweeping expired listings: {str(e)}")
+    return {"status": "Expired listings removed", "sweep": last_sweep}
+
 
 @app.post("/add-file")
-def add_excel(file: fastapi.UploadFile):
-    
+def add_excel(file: fastapi.UploadFile, incremental: bool = True):
+    """Queue an Excel/CSV upload as a background job and return its ID immediately."""
+    filename = getattr(file, "filename", "") or ""
+    # the upload's temp file is closed once this request returns, so the job reads a copy
     try:
-        filename = getattr(file, "filename", "") or ""
-        if filename.lower().endswith(".csv"):
-            df = clean_csv_data(file)
-        else:
-            df = clean_data(file)
-        texts = df.apply(
-            lambda row: " ".join(str(row[col]) for col in embedColumns),
-            axis=1
-        )
-        embeddings = embed_texts(texts.tolist())
-        # Prepare metadata for each row
-        metadata = df[metadataColumns].to_dict(orient="records")
-        upload_to_chroma(embeddings, texts.tolist(), metadata)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as copy:
+            shutil.copyfileobj(file.file, copy)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing Excel data: {str(e)}")
-    return {"status": "Excel file data added successfully"}, 201
+    read_chunks = iter_csv_chunks if filename.lower().endswith(".csv") else iter_excel_chunks
+
+    def shards():
+        with open(copy.name, "rb") as source:
+            yield from frame_shards(read_chunks(source))
+
+    job = jobs.submit("file", filename, shards, incremental, cleanup=lambda: os.remove(copy.name))
+    return {"status": "Upload accepted", "job": job.to_dict()}, 202
 
 @app.post("/add-json")
-async def add_json(request: fastapi.Request):
-    try:
-        data = await request.json()
-        if not isinstance(data, list):
-            raise HTTPException(status_code=400, detail="Expected a list of job listings")
-        # Process data
-        texts = [
-            " ".join(str(item[col]) for col in embedColumns)
-            for item in data
-        ]
-        embeddings = embed_texts(texts)
-        # Use the original data as metadata
-        metadata = [{"source": "json_upload", **item} for item in data]
-        upload_to_chroma(embeddings, texts, metadata)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing JSON data: {str(e)}")
-    return {"status": "JSON data added successfully"}, 201
+async def add_json(request: fastapi.Request, incremental: bool = True):
+    """Queue a JSON list of listings as a background job and return its ID immediately."""
+    data = await request.json()
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="Expected a list of job listings")
+
+    def shards():
+        for i in range(0, len(data), INGEST_CHUNK_SIZE):
+            items = data[i:i + INGEST_CHUNK_SIZE]
+            yield listing_texts(pd.DataFrame(items)), json_metadata(items), 0
+
+    job = jobs.submit("json", f"{len(data)} listings", shards, incremental)
+    return {"status": "Upload accepted", "job": job.to_dict()}, 202
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": jobs.list()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No ingest job {job_id}")
+    return job.to_dict()
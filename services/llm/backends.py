@@ -0,0 +1,88 @@
+import os
+
+import torch
+from torch import nn
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from startup import NON_TORCH_FILES, TORCH_FILES, local_snapshot
+
+# torch | torch-int8 | ggml
+LLM_BACKEND = os.getenv("LLM_BACKEND", "torch")
+MODEL_NAME = os.getenv("MODEL_NAME", "distilgpt2")
+# GGML settings default to the Llama 2 chat model from model.py
+GGML_MODEL = os.getenv("GGML_MODEL", "TheBloke/Llama-2-7B-Chat-GGML")
+GGML_MODEL_FILE = os.getenv("GGML_MODEL_FILE") or None
+GGML_MODEL_TYPE = os.getenv("GGML_MODEL_TYPE", "llama")
+GGML_TOKENIZER = os.getenv("GGML_TOKENIZER", "meta-llama/Llama-2-7b-chat-hf")
+GGML_LIB = os.getenv("GGML_LIB", "avx2")
+
+BACKENDS = ("torch", "torch-int8", "ggml")
+
+
+class Backend:
+    """A loaded model + tokenizer pair exposing the transformers `generate` API."""
+
+    def __init__(self, name: str, model, tokenizer, supports_batching: bool = True):
+        self.name = name
+        self.model = model
+        self.tokenizer = tokenizer
+        # padded multi-prompt generate calls; the GGML bindings only take one prompt
+        self.supports_batching = supports_batching
+
+
+def load_backend(name: str = LLM_BACKEND, model_name: str = MODEL_NAME) -> Backend:
+    if name == "torch":
+        return _load_torch(model_name)
+    if name == "torch-int8":
+        return _load_torch_int8(model_name)
+    if name == "ggml":
+        return _load_ggml()
+    raise ValueError(f"Unknown LLM_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def _load_torch(model_name: str) -> Backend:
+    path = local_snapshot(model_name, ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES)
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForCausalLM.from_pretrained(
+        path,
+        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+        device_map="auto" if torch.cuda.is_available() else None,
+        low_cpu_mem_usage=True
+    )
+    model.eval()
+    return Backend("torch", model, tokenizer)
+
+
+def _load_torch_int8(model_name: str) -> Backend:
+    """fp32 weights with dynamic int8 quantization of every linear layer (CPU only)."""
+    path = local_snapshot(model_name, ignore_patterns=NON_TORCH_FILES, required=TORCH_FILES)
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForCausalLM.from_pretrained(path, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+    model.eval()
+    # GPT-2 style models use transformers' Conv1D, which quantize_dynamic skips
+    _conv1d_to_linear(model)
+    model = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    return Backend("torch-int8", model, tokenizer)
+
+
+def _conv1d_to_linear(module: nn.Module):
+    from transformers.pytorch_utils import Conv1D
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            # Conv1D computes x @ W + b with W stored as (in, out)
+            linear = nn.Linear(child.weight.shape[0], child.weight.shape[1])
+            linear.weight = nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = nn.Parameter(child.bias.detach())
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def _load_ggml() -> Backend:
+    # optional dependency, only needed for this backend
+    from ctransformers import AutoModelForCausalLM as GGMLModelForCausalLM
+    model = GGMLModelForCausalLM.from_pretrained(
+        GGML_MODEL, model_file=GGML_MODEL_FILE, model_type=GGML_MODEL_TYPE, lib=GGML_LIB, hf=True
+    )
+    tokenizer = AutoTokenizer.from_pretrained(GGML_TOKENIZER)
+    return Backend("ggml", model, tokenizer, supports_batching=False)
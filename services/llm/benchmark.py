@@ -0,0 +1,107 @@
+"""
+Compare LLM backends on this machine: load time, resident memory and tokens/sec.
+
+    python benchmark.py                          # every backend
+    python benchmark.py --backends torch torch-int8 --new-tokens 64 --runs 3
+
+Each backend is measured in its own subprocess so resident memory isn't shared
+between them.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+PROMPT = (
+    "Rank the job listings below from most to least relevant to the query and briefly "
+    "explain why each is a good fit.\nQuery: software intern remote\nListings:\n"
+    "[1] Software Engineering Intern | Internship | Acme | Provo UT Onsite | $22/hr Hourly\n"
+    "[2] Data Analyst Intern | Internship | Globex | Remote | $20/hr Hourly\n"
+    "Ranking:\n"
+)
+
+
+def resident_memory_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def measure(backend_name: str, new_tokens: int, runs: int) -> dict:
+    import torch
+    from backends import load_backend
+
+    started = time.perf_counter()
+    backend = load_backend(backend_name)
+    load_seconds = time.perf_counter() - started
+    tokenizer = backend.tokenizer
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    inputs = tokenizer(PROMPT, return_tensors="pt")
+
+    def generate():
+        with torch.no_grad():
+            return backend.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.pad_token_id,
+            )
+
+    generate()  # warm-up
+    timings, tokens = [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        outputs = generate()
+        timings.append(time.perf_counter() - started)
+        tokens += outputs.shape[1] - inputs["input_ids"].shape[1]
+    return {
+        "backend": backend_name,
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb": round(resident_memory_mb(), 1),
+        "tokens_per_sec": round(tokens / sum(timings), 2),
+        "seconds_per_run": round(sum(timings) / runs, 3),
+    }
+
+
+def main():
+    from backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.new_tokens, args.runs)))
+        return
+
+    results = []
+    for name in args.backends:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", name, "--new-tokens", str(args.new_tokens), "--runs", str(args.runs)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            results.append({"backend": name, "error": proc.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'backend':<12} {'load s':>8} {'RSS MB':>8} {'tok/s':>8}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<12} failed: {r['error']}")
+        else:
+            print(f"{r['backend']:<12} {r['load_seconds']:>8} {r['rss_mb']:>8} {r['tokens_per_sec']:>8}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
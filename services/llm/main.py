@@ -1,17 +1,30 @@
 import fastapi
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import WebSocket, WebSocketDisconnect
-from transformers import AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer
 import torch
 import os
 import json
 import asyncio
-from threading import Thread
+import time
+from scheduler import GenerationScheduler, QueueFull
+from streaming import Generation, StreamSlots
+from backends import load_backend, LLM_BACKEND, MODEL_NAME, GGML_MODEL
+from instrumentation import gauge, instrument, observe_stage, observe_tokens_per_second, stage
+from startup import Startup, attach_debugger, readiness
 
-# For debugging
-import debugpy
-debugpy.listen(("0.0.0.0", 5681))
-print("Waiting for debugger attach...")
+attach_debugger(5681)
+startup = Startup("llm")
+
+# two prompts of different lengths so warm-up also runs the padded batch path
+WARMUP_PROMPTS = [
+    "Rank the job listings below from most to least relevant to the query.",
+    "Query: software intern remote\n[1] Software Engineering Intern | Internship | Acme | Provo UT | $22/hr",
+]
+WARMUP_TOKENS = int(os.getenv("WARMUP_TOKENS", "16"))
+# /v2/generate-stream: decoded pieces are sent as one delta per window, and generate()
+# pauses once this many pieces are waiting to be sent
+STREAM_WINDOW_MS = float(os.getenv("STREAM_WINDOW_MS", "30"))
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "64"))
 
 app = fastapi.FastAPI()
 
@@ -22,35 +35,70 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(app, "llm")
+readiness(app, startup)
 
 model = None
 tokenizer = None
+scheduler = GenerationScheduler(
+    max_queue=int(os.getenv("GENERATE_MAX_QUEUE", "16")),
+    max_batch_size=int(os.getenv("GENERATE_MAX_BATCH_SIZE", "4")),
+    max_wait_ms=float(os.getenv("GENERATE_MAX_WAIT_MS", "20")),
+)
+gauge("generate_queue_depth", "/generate prompts waiting for the model", lambda: scheduler.stats()["queue_depth"])
+# streamed generations (both websocket protocols) each run their own generate(); past
+# STREAM_MAX_ACTIVE running and STREAM_MAX_QUEUE waiting, new prompts get a `busy` error
+stream_slots = StreamSlots(
+    max_active=int(os.getenv("STREAM_MAX_ACTIVE", "4")),
+    max_queue=int(os.getenv("STREAM_MAX_QUEUE", "16")),
+)
+gauge("stream_generations_active", "Streamed generations running", lambda: stream_slots.active)
+gauge("stream_generations_waiting", "Streamed generations waiting for a slot", lambda: stream_slots.waiting)
+
+def warm_up(backend):
+    """A short generation so the first real request doesn't pay for kernel selection and allocator growth."""
+    prompts = WARMUP_PROMPTS if backend.supports_batching else WARMUP_PROMPTS[:1]
+    inputs = backend.tokenizer(prompts, return_tensors="pt", padding=True)
+    if torch.cuda.is_available():
+        inputs = {k: v.cuda() for k, v in inputs.items()}
+    with torch.no_grad():
+        backend.model.generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            max_new_tokens=WARMUP_TOKENS,
+            do_sample=False,
+            pad_token_id=backend.tokenizer.pad_token_id,
+        )
 
-@app.on_event("startup")
 async def load_model():
     global model, tokenizer
-    print("Loading model...")
-    # model_name = os.getenv("MODEL_NAME", "distilgpt2") 
-    model_name = "distilgpt2"
+    print(f"Loading model with {LLM_BACKEND} backend...")
     
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name, 
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            device_map="auto" if torch.cuda.is_available() else None,
-            # load_in_8bit=True,
-            low_cpu_mem_usage=True
-        )
+        backend = await startup.step("load_model", load_backend, LLM_BACKEND, MODEL_NAME)
         
         # Set pad token if not set
-        if tokenizer.pad_token is None:
-            tokenizer.pad_token = tokenizer.eos_token
-            
-        print(f"Model {model_name} loaded successfully!")
+        if backend.tokenizer.pad_token is None:
+            backend.tokenizer.pad_token = backend.tokenizer.eos_token
+        # decoder-only models continue from the right edge, so batched prompts pad on the left
+        backend.tokenizer.padding_side = "left"
+        if not backend.supports_batching:
+            scheduler.max_batch_size = 1
+        print(f"Model {MODEL_NAME if backend.name != 'ggml' else GGML_MODEL} loaded successfully!")
+
+        await startup.step("warmup", warm_up, backend)
     except Exception as e:
         print(f"Error loading model: {e}")
-        raise
+        return
+    # requests are only accepted once the model is warm
+    model, tokenizer = backend.model, backend.tokenizer
+    scheduler.start(model, tokenizer)
+    startup.mark_ready()
+
+@app.on_event("startup")
+async def start_loading_model():
+    # in the background: the app answers /health and /ready (503) while the model loads
+    asyncio.get_running_loop().create_task(load_model())
 
 @app.post("/generate")
 async def generate_text(request: fastapi.Request):
@@ -68,43 +116,53 @@ async def generate_text(request: fastapi.Request):
         if not prompt:
             raise fastapi.HTTPException(status_code=400, detail="Prompt is required")
         
-        # Tokenize input
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
-        
-        # Move to device if using GPU
-        if torch.cuda.is_available():
-            inputs = {k: v.cuda() for k, v in inputs.items()}
-        
-        # Generate
-        with torch.no_grad():
-            outputs = model.generate(
-                inputs.input_ids,
-                attention_mask=inputs.attention_mask,
-                max_new_tokens=max_tokens,
-                do_sample=True,
-                temperature=temperature,
-                pad_token_id=tokenizer.eos_token_id,
-                eos_token_id=tokenizer.eos_token_id,
-                no_repeat_ngram_size=2
-            )
-        
-        # Decode response
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Remove the original prompt from response
-        if response.startswith(prompt):
-            response = response[len(prompt):].strip()
+        with stage("generate"):
+            response = await scheduler.generate(prompt, max_tokens, temperature)
         
         return {"response": response}
         
+    except QueueFull as e:
+        raise fastapi.HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except fastapi.HTTPException:
+        raise
     except Exception as e:
         print(f"Generation error: {e}")
         raise fastapi.HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
+def observe_stream(generation: Generation):
+    ended = time.perf_counter()
+    observe_stage("stream", ended - generation.started_at)
+    if generation.first_piece_at is not None:
+        observe_stage("ttft", generation.first_piece_at - generation.started_at)
+        observe_tokens_per_second(generation.pieces, ended - generation.first_piece_at)
+
+async def start_generation(request_data: dict) -> Generation:
+    """Wait for a stream slot (QueueFull if too many are waiting) and start the generation in it."""
+    await stream_slots.acquire()
+    try:
+        generation = Generation(
+            model, tokenizer,
+            request_data.get("prompt", ""),
+            max_tokens=request_data.get("max_tokens", 512),
+            temperature=request_data.get("temperature", 0.7),
+            max_pending=STREAM_MAX_PENDING,
+            on_exit=stream_slots.release,
+        )
+        generation.start()
+    except Exception:
+        stream_slots.release()
+        raise
+    return generation
+
+def busy_frame(e: QueueFull) -> str:
+    return json.dumps({"type": "error", "code": "busy", "message": str(e), "retry_after": 1})
+
 @app.websocket("/generate-stream")
 async def generate_stream(websocket: WebSocket):
-    global model, tokenizer
-    
+    """
+    v1 protocol, kept for older clients: one `token` frame per decoded piece,
+    each also carrying the full text so far. New clients use /v2/generate-stream.
+    """
     await websocket.accept()
     
     if model is None or tokenizer is None:
@@ -115,73 +173,43 @@ async def generate_stream(websocket: WebSocket):
         await websocket.close()
         return
     
+    generation = None
     try:
         while True:
             # Receive request
-            data = await websocket.receive_text()
-            request_data = json.loads(data)
+            request_data = json.loads(await websocket.receive_text())
             
-            prompt = request_data.get("prompt", "")
-            max_tokens = request_data.get("max_tokens", 512)
-            temperature = request_data.get("temperature", 0.7)
-            
-            if not prompt:
+            if not request_data.get("prompt", ""):
                 await websocket.send_text(json.dumps({
                     "type": "error",
                     "message": "Prompt is required"
                 }))
                 continue
             
+            try:
+                generation = await start_generation(request_data)
+            except QueueFull as e:
+                await websocket.send_text(busy_frame(e))
+                continue
+
             # Send start signal
             await websocket.send_text(json.dumps({
                 "type": "start",
                 "message": "Starting generation..."
             }))
             
-            # Tokenize input
-            inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
-            
-            # Move to device if using GPU
-            if torch.cuda.is_available():
-                inputs = {k: v.cuda() for k, v in inputs.items()}
-            
-            # Create streamer
-            streamer = TextIteratorStreamer(
-                tokenizer, 
-                timeout=120, 
-                skip_prompt=True, 
-                skip_special_tokens=True
-            )
-            
-            # Generation parameters
-            generation_kwargs = dict(
-                input_ids=inputs.input_ids,
-                attention_mask=inputs.attention_mask,
-                max_new_tokens=max_tokens,
-                do_sample=True,
-                temperature=temperature,
-                pad_token_id=tokenizer.eos_token_id,
-                eos_token_id=tokenizer.eos_token_id,
-                streamer=streamer,
-                no_repeat_ngram_size=2
-            )
-            
-            # Run generation in separate thread
-            thread = Thread(target=model.generate, kwargs=generation_kwargs)
-            thread.start()
-            
-            # Stream tokens as they're generated
             full_response = ""
-            for new_text in streamer:
-                if new_text:
-                    full_response += new_text
-                    await websocket.send_text(json.dumps({
-                        "type": "token",
-                        "token": new_text,
-                        "full_text": full_response
-                    }))
-                    # await asyncio.sleep(0.05)
-            
+            async for new_text in generation.pieces_iter():
+                full_response += new_text
+                await websocket.send_text(json.dumps({
+                    "type": "token",
+                    "token": new_text,
+                    "full_text": full_response
+                }))
+            observe_stream(generation)
+            generation.close()
+            generation = None
+
             # Send completion signal
             await websocket.send_text(json.dumps({
                 "type": "complete",
@@ -199,6 +227,96 @@ async def generate_stream(websocket: WebSocket):
             }))
         except:
             pass
+    finally:
+        # a client that went away mid-generation stops the model at its next token
+        if generation is not None:
+            generation.close()
+
+def _stop_requested(message: asyncio.Future) -> bool:
+    """True if a message that arrived mid-generation is a stop, or the socket closed."""
+    if message.cancelled():
+        return False
+    if message.exception() is not None:
+        return True
+    try:
+        return json.loads(message.result()).get("type") == "stop"
+    except (ValueError, AttributeError):
+        return False
+
+@app.websocket("/v2/generate-stream")
+async def generate_stream_v2(websocket: WebSocket):
+    """
+    Client -> server: {"prompt", "max_tokens"?, "temperature"?} starts a generation,
+    {"type": "stop"} ends the running one early.
+    Server -> client: `start`; `delta` frames {"text"} holding only the new text,
+    coalesced per STREAM_WINDOW_MS; `complete` {"reason": "finished" | "stopped",
+    "pieces"}; `error`, with "code": "busy" and "retry_after" when no stream slot
+    is free (the socket stays open). Disconnecting stops the generation as well.
+    """
+    await websocket.accept()
+
+    if model is None or tokenizer is None:
+        await websocket.send_text(json.dumps({"type": "error", "message": "Model not loaded yet"}))
+        await websocket.close()
+        return
+
+    incoming = None
+    generation = None
+    try:
+        while True:
+            if incoming is None:
+                incoming = asyncio.ensure_future(websocket.receive_text())
+            request_data = json.loads(await incoming)
+            incoming = None
+            if request_data.get("type") == "stop":
+                # nothing running (it already finished)
+                continue
+            if not request_data.get("prompt", ""):
+                await websocket.send_text(json.dumps({"type": "error", "message": "Prompt is required"}))
+                continue
+
+            try:
+                generation = await start_generation(request_data)
+            except QueueFull as e:
+                await websocket.send_text(busy_frame(e))
+                continue
+            await websocket.send_text(json.dumps({"type": "start"}))
+            # the next message is read while streaming, so a stop (or a disconnect) cancels generate()
+            incoming = asyncio.ensure_future(websocket.receive_text())
+            incoming.add_done_callback(lambda message, g=generation: _stop_requested(message) and g.cancel())
+            async for delta in generation.deltas(STREAM_WINDOW_MS):
+                await websocket.send_text(json.dumps({"type": "delta", "text": delta}))
+            observe_stream(generation)
+            stopped = generation.cancelled.is_set()
+            pieces = generation.pieces
+            generation.close()
+            generation = None
+            if incoming.done() and not incoming.cancelled() and incoming.exception() is not None:
+                raise incoming.exception()
+            await websocket.send_text(json.dumps({
+                "type": "complete",
+                "reason": "stopped" if stopped else "finished",
+                "pieces": pieces,
+            }))
+
+    except WebSocketDisconnect:
+        print("WebSocket disconnected")
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+        try:
+            await websocket.send_text(json.dumps({"type": "error", "message": f"Generation error: {str(e)}"}))
+        except Exception:
+            pass
+    finally:
+        if generation is not None:
+            generation.close()
+        if incoming is not None and not incoming.done():
+            incoming.cancel()
+
+@app.get("/stats")
+def stats():
+    return {"backend": LLM_BACKEND, "scheduler": scheduler.stats(), "streams": stream_slots.stats(),
+            "startup": startup.status()}
 
 @app.get("/health")
 def health():
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from instrumentation import observe_stage, observe_tokens_per_second
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _Request:
+    __slots__ = ("prompt", "max_tokens", "temperature", "future", "enqueued_at")
+
+    def __init__(self, prompt: str, max_tokens: int, temperature: float, future: asyncio.Future):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+    def compatible(self, other: "_Request") -> bool:
+        return self.max_tokens == other.max_tokens and self.temperature == other.temperature
+
+
+class GenerationScheduler:
+    """
+    Runs /generate requests on a dedicated worker thread instead of the event loop.
+
+    Pending prompts wait in a bounded queue (excess load is rejected immediately
+    with QueueFull). The worker waits up to max_wait_ms for company, then takes up
+    to max_batch_size prompts that share generation settings and runs them as a
+    single left-padded, attention-masked `generate` call.
+    """
+
+    def __init__(self, max_queue: int = 16, max_batch_size: int = 4, max_wait_ms: float = 20.0,
+                 max_input_tokens: int = 2048):
+        self.max_queue = max_queue
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_input_tokens = max_input_tokens
+        self.model = None
+        self.tokenizer = None
+        self._pending = deque()
+        self._wakeup = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generate")
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def start(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def generate(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        if len(self._pending) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(f"Generation queue is full ({self.max_queue} pending)")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Request(prompt, max_tokens, temperature, future))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self._pending) < self.max_batch_size:
+                await asyncio.sleep(self.max_wait)
+            batch = self._take_batch()
+            started = time.perf_counter()
+            try:
+                responses, tokens = await loop.run_in_executor(self._executor, self._generate_batch, batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+            self.batches += 1
+            self.requests += len(batch)
+            self.wait_seconds += sum(started - request.enqueued_at for request in batch)
+            self.generated_tokens += tokens
+            self.generation_seconds += elapsed
+            for request in batch:
+                observe_stage("queue_wait", started - request.enqueued_at)
+            observe_stage("generate_batch", elapsed)
+            observe_tokens_per_second(tokens, elapsed)
+            for request, response in zip(batch, responses):
+                if not request.future.done():
+                    request.future.set_result(response)
+
+    def _take_batch(self) -> list:
+        first = self._pending.popleft()
+        batch, skipped = [first], []
+        while self._pending and len(batch) < self.max_batch_size:
+            request = self._pending.popleft()
+            (batch if request.compatible(first) else skipped).append(request)
+        # incompatible prompts keep their place at the front of the queue
+        self._pending.extendleft(reversed(skipped))
+        return batch
+
+    def _generate_batch(self, batch: list):
+        tokenizer = self.tokenizer
+        inputs = tokenizer(
+            [request.prompt for request in batch],
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=self.max_input_tokens,
+        )
+        if torch.cuda.is_available():
+            inputs = {k: v.cuda() for k, v in inputs.items()}
+        with torch.no_grad():
+            outputs = self.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_new_tokens=batch[0].max_tokens,
+                do_sample=True,
+                temperature=batch[0].temperature,
+                pad_token_id=tokenizer.pad_token_id,
+                eos_token_id=tokenizer.eos_token_id,
+                no_repeat_ngram_size=2
+            )
+        # prompts are left-padded, so every row's new tokens start at the same offset
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        generated = int((new_tokens != tokenizer.pad_token_id).sum())
+        responses = [text.strip() for text in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+        return responses, generated
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue": self.max_queue,
+            "max_batch_size": self.max_batch_size,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 3) if self.batches else None,
+            "generated_tokens": self.generated_tokens,
+            "tokens_per_sec": round(self.generated_tokens / self.generation_seconds, 2) if self.generation_seconds else None,
+            "avg_queue_wait_ms": round(self.wait_seconds / self.requests * 1000, 1) if self.requests else None,
+        }
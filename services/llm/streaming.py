@@ -0,0 +1,242 @@
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Callable, Optional
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextStreamer
+
+from scheduler import QueueFull
+
+_END = object()
+
+
+class StreamSlots:
+    """
+    Admission control for streamed generations, which run on their own threads
+    rather than through GenerationScheduler: at most max_active generate() calls
+    at once, up to max_queue more waiting for a slot, and anything beyond that is
+    rejected with QueueFull.
+    """
+
+    def __init__(self, max_active: int, max_queue: int):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    async def acquire(self):
+        if self._semaphore is None:
+            # created on the serving loop (asyncio primitives bind to a loop on 3.9)
+            self._semaphore = asyncio.Semaphore(self.max_active)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(f"Streaming is at capacity ({self.max_active} running, {self.waiting} waiting)")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class _Cancelled(StoppingCriteria):
+    """Stops generate() at the next token once the stream is cancelled."""
+
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancelled.is_set()
+
+
+class _QueueStreamer(TextStreamer):
+    """
+    Hands decoded text from the generate() thread to an asyncio queue. At most
+    max_pending pieces can be unread; past that generate() blocks until the
+    consumer catches up (or the stream is cancelled).
+    """
+
+    def __init__(self, tokenizer, generation: "Generation", max_pending: int, **decode_kwargs):
+        super().__init__(tokenizer, skip_prompt=True, **decode_kwargs)
+        self.generation = generation
+        self.slots = threading.Semaphore(max_pending)
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            while not self.slots.acquire(timeout=0.1):
+                if self.generation.cancelled.is_set():
+                    return
+            self.generation.deliver(text)
+        if stream_end:
+            self.generation.deliver(_END)
+
+
+class Generation:
+    """
+    One streamed model.generate() call on its own thread.
+
+        generation = Generation(model, tokenizer, prompt, max_tokens, temperature)
+        generation.start()
+        async for delta in generation.deltas(window_ms=30):
+            ...
+        generation.cancel()     # e.g. "stop" from the client: generate() stops at its next token
+        generation.close()      # when done with it
+    """
+
+    def __init__(self, model, tokenizer, prompt: str, max_tokens: int, temperature: float,
+                 max_pending: int = 64, max_input_tokens: int = 2048, on_exit: Optional[Callable[[], None]] = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_input_tokens = max_input_tokens
+        self.cancelled = threading.Event()
+        self.pieces = 0
+        self.started_at = None
+        self.first_piece_at = None
+        self._loop = None
+        self._queue = asyncio.Queue()
+        self._getter = None
+        self._streamer = _QueueStreamer(tokenizer, self, max_pending, skip_special_tokens=True)
+        self._thread = None
+        # called on the event loop once the generate() thread has returned (e.g. StreamSlots.release)
+        self._on_exit = on_exit
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._generate, name="generate-stream", daemon=True)
+        self._thread.start()
+
+    def _generate(self):
+        try:
+            inputs = self.tokenizer(self.prompt, return_tensors="pt", truncation=True, max_length=self.max_input_tokens)
+            if torch.cuda.is_available():
+                inputs = {k: v.cuda() for k, v in inputs.items()}
+            with torch.no_grad():
+                self.model.generate(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"],
+                    max_new_tokens=self.max_tokens,
+                    do_sample=True,
+                    temperature=self.temperature,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    eos_token_id=self.tokenizer.eos_token_id,
+                    streamer=self._streamer,
+                    stopping_criteria=StoppingCriteriaList([_Cancelled(self.cancelled)]),
+                    no_repeat_ngram_size=2
+                )
+        except Exception as e:
+            self.deliver(e)
+            self.deliver(_END)
+        finally:
+            if self._on_exit is not None:
+                try:
+                    self._loop.call_soon_threadsafe(self._on_exit)
+                except RuntimeError:
+                    # event loop closed (server shutting down)
+                    pass
+
+    def deliver(self, item):
+        # called from the generate() thread; once cancelled nobody reads the queue
+        if self.cancelled.is_set():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # event loop closed (server shutting down)
+            self.cancelled.set()
+
+    def cancel(self):
+        """Stop generate() at its next token and end the consumer's iteration; safe to call more than once."""
+        if not self.cancelled.is_set():
+            self.cancelled.set()
+            self._queue.put_nowait(_END)
+
+    def close(self):
+        """cancel() and drop the pending queue read; call once the stream is no longer being consumed."""
+        self.cancel()
+        if self._getter is not None:
+            self._getter.cancel()
+            self._getter = None
+
+    async def _next(self, timeout: Optional[float] = None):
+        # one get() is kept pending across timeouts, so a piece arriving as a window closes isn't lost
+        if self._getter is None:
+            self._getter = asyncio.ensure_future(self._queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+        if not done:
+            raise asyncio.TimeoutError
+        item = self._getter.result()
+        self._getter = None
+        if item is _END:
+            return _END
+        if isinstance(item, Exception):
+            raise item
+        self._streamer.slots.release()
+        self.pieces += 1
+        if self.first_piece_at is None:
+            self.first_piece_at = time.perf_counter()
+        return item
+
+    async def pieces_iter(self) -> AsyncIterator[str]:
+        """Text pieces one at a time, as the streamer decodes them."""
+        while True:
+            item = await self._next()
+            if item is _END:
+                return
+            yield item
+
+    async def deltas(self, window_ms: float) -> AsyncIterator[str]:
+        """
+        Text pieces coalesced into one delta per window_ms. The first piece is
+        sent on its own so time to first token isn't delayed by the window.
+        """
+        window = window_ms / 1000
+        first = True
+        while True:
+            item = await self._next()
+            if item is _END:
+                return
+            if first:
+                first = False
+                yield item
+                continue
+            buffer = [item]
+            deadline = time.perf_counter() + window
+            ended = False
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await self._next(remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is _END:
+                    ended = True
+                    break
+                buffer.append(item)
+            yield "".join(buffer)
+            if ended:
+                return
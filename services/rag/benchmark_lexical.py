@@ -0,0 +1,98 @@
+"""
+Build time, memory and query latency of the BM25 lexical index on synthetic listings.
+
+    python benchmark_lexical.py                    # 10k and 100k listings
+    python benchmark_lexical.py --listings 50000 --queries 2000
+
+Memory is measured with tracemalloc (allocated by the build) alongside the
+index's own approx_mb estimate. Incremental upserts of 1000 listings are timed
+to show the cost of the refresh hook ingest calls per shard.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from lexical import LexicalIndex
+
+TITLES = ["Software Engineering Intern", "Data Analyst", "Research Assistant", "Marketing Coordinator",
+          "Teaching Assistant", "Mechanical Engineer", "Accounting Intern", "Product Designer"]
+EMPLOYMENT_TYPES = ["Internship", "Full-Time", "Part-Time", "On-Campus Student Employment"]
+SKILLS = ["python", "sql", "excel", "react", "typescript", "solidworks", "tableau", "c++", "c#", "spss",
+          "salesforce", "figma", "kubernetes", "pipetting", "quickbooks", "photoshop", "matlab", "r"]
+CITIES = ["Provo, UT", "Salt Lake City, UT", "Austin, TX", "Seattle, WA", "Remote"]
+
+
+def synthetic_listings(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    ids, documents, metadatas = [], [], []
+    for i in range(n):
+        meta = {
+            "Title": rng.choice(TITLES),
+            "Employment Type": rng.choice(EMPLOYMENT_TYPES),
+            "Employer": f"Company{rng.randrange(5000)}",
+            "Job Roles": " ".join(rng.sample(SKILLS, 4)),
+            "Job Location": rng.choice(CITIES),
+            "Location Type": rng.choice(["Remote", "Hybrid", "Onsite"]),
+        }
+        ids.append(f"job-{i}")
+        documents.append(f"{meta['Title']} {meta['Employment Type']}")
+        metadatas.append(meta)
+    return ids, documents, metadatas
+
+
+def sample_queries(n: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [f"{rng.choice(TITLES).split()[0]} {rng.choice(SKILLS)} Company{rng.randrange(5000)}" for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", nargs="+", type=int, default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.listings:
+        ids, documents, metadatas = synthetic_listings(n)
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = LexicalIndex()
+        index.upsert(ids, documents, metadatas)
+        build_seconds = time.perf_counter() - started
+        traced_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        tracemalloc.stop()
+
+        latencies = []
+        for q in sample_queries(args.queries):
+            started = time.perf_counter()
+            index.search(q, args.top)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        index.upsert(ids[:1000], documents[:1000], metadatas[:1000])
+        upsert_ms = (time.perf_counter() - started) * 1000
+
+        stats = index.stats()
+        results.append({
+            "listings": n,
+            "terms": stats["terms"],
+            "build_seconds": round(build_seconds, 3),
+            "traced_mb": round(traced_mb, 1),
+            "approx_mb": stats["approx_mb"],
+            "query_ms": {"p50": round(float(np.percentile(latencies, 50)), 3),
+                         "p95": round(float(np.percentile(latencies, 95)), 3)},
+            "upsert_1000_ms": round(upsert_ms, 1),
+        })
+        r = results[-1]
+        print(f"{n:>8} listings: build {r['build_seconds']}s, {r['traced_mb']} MB, "
+              f"query p50 {r['query_ms']['p50']} ms / p95 {r['query_ms']['p95']} ms")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import math
+import os
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+from startup import local_snapshot
+
+# hub name of the LLM's tokenizer, used to count prompt tokens exactly
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "distilgpt2")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "512"))
+MAX_ROLES_CHARS = 200
+
+# Fixed instruction prefix: identical for every request so the LLM side can reuse
+# its cached prefix; everything request-specific comes after it.
+PROMPT_PREFIX = (
+    "Rank the job listings below from most to least relevant to the query and "
+    "briefly explain why each is a good fit. Each listing is one line: "
+    "[n] title | type | employer | location | salary | roles.\n"
+)
+
+
+def _present(value) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    return str(value).strip().lower() not in ("", "nan", "none", "nat")
+
+
+def render_listing(n: int, meta: dict) -> str:
+    """Dense single-line rendering of a listing; empty fields are dropped."""
+    def field(*keys):
+        return " ".join(str(meta[k]).strip() for k in keys if _present(meta.get(k)))
+
+    roles = field("Job Roles")
+    if len(roles) > MAX_ROLES_CHARS:
+        roles = roles[:MAX_ROLES_CHARS].rsplit(" ", 1)[0] + "…"
+    parts = [
+        field("Title"),
+        field("Employment Type"),
+        field("Employer"),
+        field("Job Location", "Location Type"),
+        field("Job Salary", "Salary Type"),
+        roles,
+    ]
+    return f"[{n}] " + " | ".join(p for p in parts if p) + "\n"
+
+
+@lru_cache(maxsize=1)
+def token_counter() -> Callable[[str], int]:
+    try:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(os.path.join(local_snapshot(LLM_TOKENIZER, allow_patterns=["tokenizer.json"], required=["tokenizer.json"]), "tokenizer.json"))
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+    except Exception as e:
+        # roughly 4 characters per token for English BPE vocabularies
+        print(f"Could not load tokenizer {LLM_TOKENIZER} ({e}); estimating token counts")
+        return lambda text: len(text) // 4 + 1
+
+
+def build_ranking_prompt(query_text: str, results: dict, token_budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[str, List[int]]:
+    """
+    Build the AI ranking prompt within token_budget tokens of the LLM tokenizer.
+    Listings are taken in Chroma's relevance order until the next one would not
+    fit. Returns the prompt and the indexes of the listings it includes.
+    """
+    count_tokens = token_counter()
+    header = f"Query: {' '.join(query_text.split())}\nListings:\n"
+    footer = "Ranking:\n"
+    used = count_tokens(PROMPT_PREFIX) + count_tokens(header) + count_tokens(footer)
+    lines, included = [], []
+    for i, meta in enumerate(results["metadatas"][0]):
+        line = render_listing(len(lines) + 1, meta or {})
+        cost = count_tokens(line)
+        if used + cost > token_budget:
+            break
+        used += cost
+        lines.append(line)
+        included.append(i)
+    return PROMPT_PREFIX + header + "".join(lines) + footer, included
@@ -0,0 +1,64 @@
+import calendar
+import time
+from typing import Optional
+
+# canonical values ingest stores for Location Type / Salary Type
+LOCATION_TYPES = ("Remote", "Hybrid", "Onsite")
+SALARY_TYPES = ("Hourly", "Weekly", "Monthly", "Yearly")
+
+
+def now_epoch() -> int:
+    # ingest stores Expires as naive local wall-clock epoch seconds; compare on the same clock
+    return calendar.timegm(time.localtime())
+
+
+def _choices(name: str, value, allowed: tuple) -> list:
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"{name} must be one of {', '.join(allowed)} or a list of them")
+    out = []
+    for v in values:
+        match = next((a for a in allowed if isinstance(v, str) and a.lower() == v.strip().lower()), None)
+        if match is None:
+            raise ValueError(f"Unknown {name} {v!r}, expected one of {', '.join(allowed)}")
+        out.append(match)
+    return out
+
+
+def _number(name: str, value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number")
+    return value
+
+
+def build_where(filters: Optional[dict]) -> Optional[dict]:
+    """
+    Translate /search `filters` into a Chroma `where` clause.
+
+      min_salary       annualized salary the listing's range must reach (Salary Max >=)
+      max_salary       annualized salary the listing's range must start under (Salary Min <=)
+      location_type    "Remote" | "Hybrid" | "Onsite", or a list of them
+      salary_type      "Hourly" | "Weekly" | "Monthly" | "Yearly", or a list of them
+      include_expired  expired listings are excluded unless this is true
+
+    Raises ValueError for unknown filters or bad values.
+    """
+    if filters is not None and not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    clauses = []
+    if not filters.pop("include_expired", False):
+        clauses.append({"Expires": {"$gte": now_epoch()}})
+    if "min_salary" in filters:
+        clauses.append({"Salary Max": {"$gte": _number("min_salary", filters.pop("min_salary"))}})
+    if "max_salary" in filters:
+        clauses.append({"Salary Min": {"$lte": _number("max_salary", filters.pop("max_salary"))}})
+    if "location_type" in filters:
+        clauses.append({"Location Type": {"$in": _choices("location_type", filters.pop("location_type"), LOCATION_TYPES)}})
+    if "salary_type" in filters:
+        clauses.append({"Salary Type": {"$in": _choices("salary_type", filters.pop("salary_type"), SALARY_TYPES)}})
+    if filters:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(filters))}")
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -1,9 +1,204 @@
-def query(collection_name: str, query_text: str, n_results: int = 15):
-    import chromadb
-    client = chromadb.HttpClient(host="chroma", port="8001")    
-    collection = client.get_collection(collection_name)
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results
-    )
-    return results
\ No newline at end of file
+import os
+import threading
+from functools import lru_cache
+import numpy as np
+import chromadb
+from clients import Client, replica_urls
+from lexical import LexicalIndex, build_index, reciprocal_rank_fusion
+from rerank import RERANK_CANDIDATES, rerank_passage, reorder, weighted_scores
+from instrumentation import stage, trace_headers
+from wire import EMBED_WIRE_MEDIA_TYPE, decode_embeddings
+
+CHROMA_HOST = os.getenv("CHROMA_HOST", "chroma")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+# candidates taken from each of the vector and BM25 rankings before fusing them
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# one long-lived client (its HTTP connection pool is reused across searches) and
+# cached collection handles; both are dropped and rebuilt after a failed call
+_client = None
+_collections = {}
+_client_lock = threading.Lock()
+# embed replicas (EMBEDDING_URLS, comma separated) for both /embed and /rerank
+embed = Client(replica_urls("EMBEDDING_URLS", "EMBEDDING_URL", "http://embed:8003/embed", path="/embed"), "embed")
+
+def get_collection(collection_name: str):
+    global _client
+    with _client_lock:
+        collection = _collections.get(collection_name)
+        if collection is None:
+            if _client is None:
+                _client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            collection = _client.get_collection(collection_name)
+            _collections[collection_name] = collection
+        return collection
+
+def reset_client():
+    global _client
+    with _client_lock:
+        _client = None
+        _collections.clear()
+
+def _with_reconnect(fn):
+    try:
+        return fn()
+    except Exception as e:
+        print(f"Chroma call failed ({e}), reconnecting")
+        reset_client()
+        return fn()
+
+def query(collection_name: str, query_text: str, n_results: int = 15, where: dict | None = None):
+    """
+    Hybrid search: the vector ranking and the BM25 ranking over listing metadata
+    fused with reciprocal rank fusion. `where` is a Chroma metadata filter applied
+    to both. Returns Chroma's query result shape plus the fused `scores`; falls
+    back to vector-only until the lexical index is built.
+    """
+    # embed with the same model used at ingest time instead of Chroma's default function
+    query_embedding = embed_query(query_text)
+    index = lexical_index
+    n_candidates = max(n_results, HYBRID_CANDIDATES) if index is not None else n_results
+    with stage("chroma_query"):
+        vector = _with_reconnect(lambda: get_collection(collection_name).query(
+            query_embeddings=[query_embedding], n_results=n_candidates, where=where))
+    if index is None:
+        return vector
+    with stage("lexical_search"):
+        lexical = index.search(query_text, n_candidates)
+    return _fuse(collection_name, vector, [doc_id for doc_id, _ in lexical], n_results, where)
+
+def _fuse(collection_name: str, vector: dict, lexical_ids: list, n_results: int, where: dict | None) -> dict:
+    rows = {
+        doc_id: (document, meta, distance)
+        for doc_id, document, meta, distance in zip(
+            vector["ids"][0], vector["documents"][0], vector["metadatas"][0], vector["distances"][0])
+    }
+    # lexical hits the vector query didn't return are fetched through the same filter;
+    # those it rejects are dropped before ranking. They have no distance.
+    missing = [doc_id for doc_id in lexical_ids if doc_id not in rows]
+    if missing:
+        with stage("chroma_get"):
+            found = _with_reconnect(lambda: get_collection(collection_name).get(
+                ids=missing, where=where, include=["documents", "metadatas"]))
+        for doc_id, document, meta in zip(found["ids"], found["documents"], found["metadatas"]):
+            rows[doc_id] = (document, meta, None)
+    lexical_ids = [doc_id for doc_id in lexical_ids if doc_id in rows]
+    fused = reciprocal_rank_fusion([vector["ids"][0], lexical_ids], k=RRF_K)[:n_results]
+    return {
+        "ids": [[doc_id for doc_id, _ in fused]],
+        "documents": [[rows[doc_id][0] for doc_id, _ in fused]],
+        "metadatas": [[rows[doc_id][1] for doc_id, _ in fused]],
+        "distances": [[rows[doc_id][2] for doc_id, _ in fused]],
+        "scores": [[round(score, 6) for _, score in fused]],
+    }
+
+def search(collection_name: str, query_text: str, n_results: int = 15, where: dict | None = None,
+           mode: str = "hybrid") -> dict:
+    """
+    query() ranked by `mode` (see rerank.RANK_MODES). The weighted and
+    cross-encoder modes re-score the top RERANK_CANDIDATES hybrid results and
+    return the best n_results with their new `scores`; cross-encoder falls back
+    to weighted when the embed service can't rerank.
+    """
+    if mode == "hybrid":
+        return query(collection_name, query_text, n_results=n_results, where=where)
+    results = query(collection_name, query_text, n_results=max(n_results, RERANK_CANDIDATES), where=where)
+    if not results["ids"][0]:
+        return results
+    if mode == "cross-encoder":
+        try:
+            with stage("rerank_cross_encoder"):
+                passages = [rerank_passage(document, meta)
+                            for document, meta in zip(results["documents"][0], results["metadatas"][0])]
+                scores = cross_encoder_scores(query_text, passages)
+            return reorder(results, scores, n_results, mode)
+        except Exception as e:
+            # the response's rank_mode says which ranking was actually applied
+            print(f"Cross-encoder rerank failed ({e}), using weighted ranking")
+    with stage("rerank_weighted"):
+        scores = weighted_scores(query_text, results)
+    return reorder(results, scores, n_results, "weighted")
+
+# BM25 index over job_listings; None until the first build finishes. Updates that
+# arrive while a full rebuild is reading Chroma are queued and replayed onto the
+# new index; it is swapped in under _index_lock once nothing is left queued, so no
+# update lands on an index that is about to be discarded. Rebuilds run one at a time.
+lexical_index = None
+_index_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+_rebuilding = False
+_pending_updates = []
+
+def rebuild_lexical_index(collection_name: str = "job_listings") -> dict:
+    global lexical_index, _rebuilding, _pending_updates
+    with _rebuild_lock:
+        with _index_lock:
+            _rebuilding = True
+        try:
+            with stage("lexical_build"):
+                index = _with_reconnect(lambda: build_index(get_collection(collection_name)))
+            while True:
+                with _index_lock:
+                    pending, _pending_updates = _pending_updates, []
+                    if not pending:
+                        lexical_index = index
+                        _rebuilding = False
+                        break
+                for upserted, deleted in pending:
+                    _apply_update(index, collection_name, upserted, deleted)
+        except Exception:
+            # the updates still queued apply to the index that keeps being served
+            with _index_lock:
+                _rebuilding = False
+                pending, _pending_updates = _pending_updates, []
+                current = lexical_index
+            if current is not None:
+                for upserted, deleted in pending:
+                    _apply_update(current, collection_name, upserted, deleted)
+            raise
+    stats = index.stats()
+    print(f"Lexical index built: {stats['documents']} listings, {stats['terms']} terms, "
+          f"{stats['approx_mb']} MB in {stats['build_seconds']}s")
+    return stats
+
+def refresh_lexical_index(upserted: list, deleted: list, collection_name: str = "job_listings"):
+    """Apply an ingest write (upserted / deleted Chroma IDs) to the lexical index."""
+    with _index_lock:
+        if _rebuilding:
+            _pending_updates.append((upserted, deleted))
+            return
+        index = lexical_index
+    if index is not None:
+        _apply_update(index, collection_name, upserted, deleted)
+
+def _apply_update(index: LexicalIndex, collection_name: str, upserted: list, deleted: list, page_size: int = 1000):
+    index.delete(deleted)
+    for i in range(0, len(upserted), page_size):
+        found = _with_reconnect(lambda: get_collection(collection_name).get(
+            ids=upserted[i:i + page_size], include=["documents", "metadatas"]))
+        index.upsert(found["ids"], found["documents"], found["metadatas"])
+
+def embed_query(query_text: str) -> np.ndarray:
+    """Embedding for a single query; repeated queries are served from a local LRU."""
+    return _embed_query(" ".join(query_text.split()))
+
+@lru_cache(maxsize=QUERY_EMBED_CACHE_SIZE)
+def _embed_query(query_text: str) -> np.ndarray:
+    return embed_texts([query_text])[0]
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Get embeddings from the embed service as a (n, dim) float32 array."""
+    with stage("embed"):
+        resp = embed.post("/embed", json={"texts": texts},
+                          headers={"Accept": EMBED_WIRE_MEDIA_TYPE, **trace_headers()})
+        resp.raise_for_status()
+    return decode_embeddings(resp)
+
+def cross_encoder_scores(query_text: str, documents: list[str]) -> list[float]:
+    """Relevance of each listing passage (rerank.rerank_passage) to the query from the embed service's cross-encoder."""
+    resp = embed.post("/rerank", json={"query": query_text, "documents": documents},
+                      headers=trace_headers())
+    resp.raise_for_status()
+    return resp.json()["scores"]
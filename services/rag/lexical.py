@@ -0,0 +1,145 @@
+import heapq
+import math
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# metadata fields searched lexically, on top of the embedded document text
+LEXICAL_FIELDS = ["Title", "Employment Type", "Employer", "Job Roles", "Job Location", "Location Type"]
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+STOPWORDS = frozenset("a an and at for in of on or the to with".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def listing_terms(document: Optional[str], meta: Optional[dict]) -> Counter:
+    meta = meta or {}
+    parts = [document or ""] + [str(meta[f]) for f in LEXICAL_FIELDS if meta.get(f) not in (None, "", "nan", "None")]
+    return Counter(tokenize(" ".join(parts)))
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over listing text and metadata, keyed by Chroma ID.
+
+    Postings map term -> {doc_id: term frequency}. Each document's distinct terms
+    are kept so upserts and deletes only touch that document's postings; corpus
+    statistics (document count, average length) are maintained incrementally.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, tuple] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self.build_seconds = None
+        self.built_at = None
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def upsert(self, ids: Iterable[str], documents: Iterable[Optional[str]], metadatas: Iterable[Optional[dict]]):
+        with self._lock:
+            for doc_id, document, meta in zip(ids, documents, metadatas):
+                self._remove(doc_id)
+                terms = listing_terms(document, meta)
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                self._doc_terms[doc_id] = tuple(terms)
+                length = sum(terms.values())
+                self._doc_lengths[doc_id] = length
+                self._total_length += length
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def search(self, query_text: str, n_results: int) -> List[Tuple[str, float]]:
+        """Top n_results (id, BM25 score) pairs for the query, best first."""
+        started = time.perf_counter()
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query_text)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        top = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return top
+
+    def approx_bytes(self) -> int:
+        """Rough resident size of the index structures (containers and keys, not shared strings)."""
+        with self._lock:
+            size = sys.getsizeof(self._postings) + sys.getsizeof(self._doc_terms) + sys.getsizeof(self._doc_lengths)
+            size += sum(sys.getsizeof(term) + sys.getsizeof(p) for term, p in self._postings.items())
+            size += sum(sys.getsizeof(terms) + sys.getsizeof(doc_id) for doc_id, terms in self._doc_terms.items())
+            return size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._doc_lengths),
+                "terms": len(self._postings),
+                "postings": sum(len(p) for p in self._postings.values()),
+                "approx_mb": round(self.approx_bytes() / 2 ** 20, 2),
+                "build_seconds": self.build_seconds,
+                "built_at": self.built_at,
+                "queries": self.queries,
+                "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else None,
+            }
+
+
+def build_index(collection, page_size: int = 1000) -> LexicalIndex:
+    """Full index of a Chroma collection, read page by page."""
+    started = time.perf_counter()
+    index = LexicalIndex()
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        index.upsert(page["ids"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
+    index.build_seconds = round(time.perf_counter() - started, 3)
+    index.built_at = time.time()
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(d) = sum over lists of 1 / (k + rank of d)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
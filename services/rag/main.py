@@ -1,14 +1,43 @@
 import fastapi
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from helpers import query
+from fastapi.responses import StreamingResponse
+import helpers
+from helpers import search as ranked_search, rebuild_lexical_index, refresh_lexical_index
+from search_cache import SearchCache
+from context import build_ranking_prompt
+from context import token_counter
+from filters import build_where
+from rerank import rank_mode
+from instrumentation import gauge, instrument, observe_stage, observe_tokens_per_second, stage, trace_headers
+from singleflight import SingleFlight
+from clients import AsyncClient, Busy, replica_urls
+from startup import Startup, attach_debugger, readiness
+import os
 import websockets
 import json
+import asyncio
+import time
+from contextlib import aclosing
 
-import debugpy
-import httpx
-debugpy.listen(("0.0.0.0", 5678))  # Use a unique port per service if debugging all at once
-print("Waiting for debugger attach...")
-# debugpy.wait_for_client()  # Optional: pause until debugger attaches
+attach_debugger(5678)
+startup = Startup("rag")
+
+search_cache = SearchCache(
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+)
+
+# seconds between full rebuilds of the lexical index; ingest keeps it current in between
+LEXICAL_REBUILD_INTERVAL = float(os.getenv("LEXICAL_REBUILD_INTERVAL", "3600"))
+
+# LLM replicas (LLM_URLS, comma separated); each search goes to the one with the fewest in flight
+llm = AsyncClient(replica_urls("LLM_URLS", "LLM_URL", "http://llm:7860"), "llm", timeout=150.0)
+
+# identical searches (same search_cache key) arriving while one is running share it
+searches = SingleFlight("search")
+search_streams = SingleFlight("search_stream")
 
 app = fastapi.FastAPI()
 app.add_middleware(
@@ -17,29 +46,241 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+instrument(app, "rag")
+readiness(app, startup)
+gauge("search_cache_entries", "Cached /search responses", lambda: search_cache.stats()["entries"])
+gauge("lexical_index_documents", "Listings in the BM25 index",
+      lambda: len(helpers.lexical_index) if helpers.lexical_index is not None else 0)
+
+async def lexical_indexer():
+    while True:
+        try:
+            await asyncio.to_thread(rebuild_lexical_index)
+            search_cache.invalidate()
+        except Exception as e:
+            # e.g. Chroma not up yet or no listings ingested; search stays vector-only
+            print(f"Lexical index build failed: {e}")
+            await asyncio.sleep(30)
+            continue
+        if LEXICAL_REBUILD_INTERVAL <= 0:
+            return
+        await asyncio.sleep(LEXICAL_REBUILD_INTERVAL)
+
+def warm_up():
+    # opens the keep-alive connection to embed and runs the prompt builder once
+    try:
+        helpers.embed_texts(["software engineering intern"])
+    except Exception as e:
+        print(f"Embed warm-up failed: {e}")
+    build_ranking_prompt("software engineering intern", {"metadatas": [[{"Title": "Software Engineering Intern"}]]})
+
+async def boot():
+    await startup.step("tokenizer", token_counter)
+    await startup.step("warmup", warm_up)
+    startup.mark_ready()
+
+@app.on_event("startup")
+async def start_lexical_indexer():
+    # the lexical index isn't waited for: search is vector-only until it's built
+    asyncio.get_running_loop().create_task(lexical_indexer())
+    asyncio.get_running_loop().create_task(boot())
+
+@app.on_event("shutdown")
+async def close_clients():
+    await llm.aclose()
 
 @app.get("/health")
 def health():
     return {"status": "RAG service is healthy"}, 200
 
+@app.get("/stats")
+def stats():
+    index = helpers.lexical_index
+    return {
+        "search_cache": search_cache.stats(),
+        "lexical_index": index.stats() if index is not None else None,
+        "coalescing": {"search": searches.stats(), "search_stream": search_streams.stats()},
+        "startup": startup.status(),
+        "upstreams": {"embed": helpers.embed.stats(), "llm": llm.stats()},
+    }
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(request: fastapi.Request):
+    """
+    Called by ingest after it writes listings, with the upserted / deleted IDs so
+    the lexical index is updated before cached searches are dropped. Without a
+    body the whole index is rebuilt in the background.
+    """
+    body = await request.body()
+    changes = json.loads(body) if body else None
+    if changes is None:
+        asyncio.get_running_loop().create_task(rebuild_after_invalidate())
+    else:
+        try:
+            await asyncio.to_thread(refresh_lexical_index, changes.get("upserted", []), changes.get("deleted", []))
+        except Exception as e:
+            print(f"Lexical index refresh failed ({e}), rebuilding")
+            asyncio.get_running_loop().create_task(rebuild_after_invalidate())
+    version = search_cache.invalidate()
+    return {"status": "Search cache invalidated", "version": version}
+
+async def rebuild_after_invalidate():
+    try:
+        await asyncio.to_thread(rebuild_lexical_index)
+        search_cache.invalidate()
+    except Exception as e:
+        print(f"Lexical index build failed: {e}")
+
 @app.post("/search")
 async def search(request: fastapi.Request):
     data = await request.json()
     n_results = data.get("n_results", 5)
-    results = query("job_listings", data["query"], n_results=n_results)
+    try:
+        where = build_where(data.get("filters"))
+        mode = rank_mode(data.get("rank_mode"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cache_key = search_cache.key(data["query"], n_results, data["use_ai"], data.get("filters"), mode)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "data": data, "cached": True}, 200
+    response, code = await searches.do(
+        cache_key, lambda: answer(cache_key, data["query"], n_results, data["use_ai"], where, mode))
+    return {**response, "data": data}, code
+
+async def answer(cache_key: tuple, query_text: str, n_results: int, use_ai: bool, where: dict | None, mode: str):
+    """Retrieval and (with use_ai) the LLM ranking for /search; shared by identical concurrent searches."""
+    cache_version = search_cache.version
+    results = await asyncio.to_thread(ranked_search, "job_listings", query_text, n_results=n_results, where=where, mode=mode)
     if not results:
         return {"status": "No results found"}, 404
-    if data["use_ai"]:
-        prompt = f"Based on the attached job listings and Query, rank the {n_results} Job Listings in order from most to least relevant and explain why they are a good fit \n\n Query: {data['query']} \n Job Listings: {results['metadatas']}"
-        LLM_URL = "http://llm:7860/generate"
+    if use_ai:
+        with stage("prompt_build"):
+            prompt, _ = await asyncio.to_thread(build_ranking_prompt, query_text, results)
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(LLM_URL, json={"prompt": prompt}, timeout=150.0)
+            with stage("llm_generate"):
+                resp = await llm.post("/generate", json={"prompt": prompt}, headers=trace_headers())
                 resp.raise_for_status()
-                ai_response = resp.text
+                # plain text, as /search-stream caches it under the same key
+                ai_response = resp.json()["response"]
         except Exception as e:
             return {"status": "Error occurred with LLM connection", "error": str(e), "results": results}, 500
-        return {"status": "Query processed with AI", "data": data, "results": results, "ai_response": ai_response}, 200
+        response = {"status": "Query processed with AI", "results": results, "ai_response": ai_response}
+    else:
+        response = {"status": "Query received", "results": results}
+    search_cache.put(cache_key, response, cache_version)
+    return response, 200
+
+def sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(payload))}\n\n"
+
+@app.post("/search-stream")
+async def search_stream(request: fastapi.Request):
+    """
+    Server-sent events version of /search: a `results` event as soon as Chroma
+    answers, then `token` events relayed from the LLM's /generate-stream when
+    use_ai is set, and a final `done` event with per-request timings.
+    """
+    data = await request.json()
+    return StreamingResponse(search_events(data), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def search_events(data: dict):
+    started = time.perf_counter()
+    n_results = data.get("n_results", 5)
+    use_ai = data.get("use_ai", False)
+    try:
+        where = build_where(data.get("filters"))
+        mode = rank_mode(data.get("rank_mode"))
+    except ValueError as e:
+        yield sse("error", {"status": "Invalid request", "error": str(e)})
+        return
+    cache_key = search_cache.key(data["query"], n_results, use_ai, data.get("filters"), mode)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        events = cached_events(cached, use_ai)
     else:
-        return {"status": "Query received", "data": data, "results": results}, 200
\ No newline at end of file
+        events = search_streams.stream(
+            cache_key, lambda: answer_events(cache_key, data["query"], n_results, use_ai, where, mode))
+    timings = {}
+    async for event, payload in events:
+        if event == "results":
+            timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            payload = {**payload, "data": data, "cached": cached is not None}
+        elif event == "token" and "ttft_ms" not in timings:
+            timings["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        yield sse(event, payload)
+        if event == "error" and "retrieval_ms" not in timings:
+            return
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"search-stream query={data['query']!r} use_ai={use_ai} timings={timings}")
+    yield sse("done", {"timings": timings})
+
+async def cached_events(cached: dict, use_ai: bool):
+    yield "results", {"status": "Query received", "results": cached["results"]}
+    if use_ai:
+        yield "token", {"token": cached["ai_response"]}
+
+async def llm_frames(ws, prompt: str):
+    """Frames of one v2 generation on `ws`, up to `complete`; error frames are raised."""
+    await ws.send(json.dumps({"prompt": prompt}))
+    async for message in ws:
+        msg = json.loads(message)
+        if msg["type"] == "error":
+            if msg.get("code") == "busy":
+                # the replica is full, not broken: llm.stream tries another one
+                raise Busy(msg.get("message"), msg.get("retry_after"))
+            raise RuntimeError(msg.get("message"))
+        yield msg
+        if msg["type"] == "complete":
+            return
+
+async def answer_events(cache_key: tuple, query_text: str, n_results: int, use_ai: bool, where: dict | None,
+                        mode: str):
+    """
+    (event, payload) pairs for /search-stream: the results, then the LLM's tokens.
+    Runs once per set of identical concurrent streams; every subscriber sees
+    all events from the start.
+    """
+    cache_version = search_cache.version
+    try:
+        results = await asyncio.to_thread(ranked_search, "job_listings", query_text, n_results=n_results,
+                                          where=where, mode=mode)
+    except Exception as e:
+        yield "error", {"status": "Search failed", "error": str(e)}
+        return
+    yield "results", {"status": "Query received", "results": results}
+
+    ai_response = None
+    if use_ai:
+        with stage("prompt_build"):
+            prompt, _ = await asyncio.to_thread(build_ranking_prompt, query_text, results)
+        tokens = []
+        try:
+            llm_started = time.perf_counter()
+            # closed explicitly so a subscriber going away also closes the websocket
+            async with aclosing(llm.stream(lambda url: websockets.connect(
+                    url.replace("http", "ws", 1) + "/v2/generate-stream", max_size=None, open_timeout=10,
+                    extra_headers=trace_headers()), lambda ws: llm_frames(ws, prompt))) as frames:
+                async for msg in frames:
+                    if msg["type"] == "delta":
+                        if not tokens:
+                            first_token_at = time.perf_counter()
+                            observe_stage("ttft", first_token_at - llm_started)
+                        tokens.append(msg["text"])
+                        yield "token", {"token": msg["text"]}
+                    elif msg["type"] == "complete":
+                        ai_response = "".join(tokens)
+                        observe_stage("llm_stream", time.perf_counter() - llm_started)
+                        if tokens:
+                            # deltas are coalesced; the LLM reports how many pieces it decoded
+                            observe_tokens_per_second(msg.get("pieces", len(tokens)), time.perf_counter() - first_token_at)
+        except Exception as e:
+            yield "error", {"status": "Error occurred with LLM connection", "error": str(e)}
+
+    if ai_response is not None or not use_ai:
+        response = {"status": "Query processed with AI" if use_ai else "Query received", "results": results}
+        if use_ai:
+            response["ai_response"] = ai_response
+        search_cache.put(cache_key, response, cache_version)
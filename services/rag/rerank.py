@@ -0,0 +1,100 @@
+import os
+from typing import List, Optional
+
+from filters import now_epoch
+from lexical import tokenize
+
+# hybrid         vector + BM25 fused with reciprocal rank fusion (the default)
+# weighted       hybrid candidates re-scored locally: vector similarity, Job Roles overlap, Expires recency
+# cross-encoder  hybrid candidates re-scored by the embed service's cross-encoder (/rerank)
+RANK_MODES = ("hybrid", "weighted", "cross-encoder")
+# hybrid candidates re-scored by the weighted and cross-encoder modes
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RANK_WEIGHT_SIMILARITY = float(os.getenv("RANK_WEIGHT_SIMILARITY", "0.6"))
+RANK_WEIGHT_ROLES = float(os.getenv("RANK_WEIGHT_ROLES", "0.3"))
+RANK_WEIGHT_RECENCY = float(os.getenv("RANK_WEIGHT_RECENCY", "0.1"))
+# a listing expiring this many days out (or later) gets the full recency score
+RECENCY_HORIZON_DAYS = float(os.getenv("RECENCY_HORIZON_DAYS", "60"))
+# squared L2 between unit vectors is 0 (same direction) to 4 (opposite)
+MAX_DISTANCE = 4.0
+# the cross-encoder truncates to RERANK_MAX_LENGTH tokens anyway; this just bounds the request
+MAX_PASSAGE_CHARS = 1000
+
+
+def rank_mode(value) -> str:
+    mode = "hybrid" if value is None else value
+    if mode not in RANK_MODES:
+        raise ValueError(f"Unknown rank_mode {value!r}, expected one of {', '.join(RANK_MODES)}")
+    return mode
+
+
+def similarity(distance: Optional[float], fallback: float) -> float:
+    if distance is None:
+        return fallback
+    return min(max(1.0 - distance / MAX_DISTANCE, 0.0), 1.0)
+
+
+def roles_overlap(query_terms: set, roles) -> float:
+    """Share of the query's terms that appear in the listing's Job Roles."""
+    if not query_terms or not isinstance(roles, str):
+        return 0.0
+    return len(query_terms & set(tokenize(roles))) / len(query_terms)
+
+
+def recency(expires, now: int) -> float:
+    """0 for expired (or undated) listings up to 1 for ones open RECENCY_HORIZON_DAYS or more."""
+    if isinstance(expires, bool) or not isinstance(expires, (int, float)):
+        return 0.0
+    return min(max((expires - now) / (RECENCY_HORIZON_DAYS * 86400), 0.0), 1.0)
+
+
+def _text(value) -> str:
+    return value.strip() if isinstance(value, str) and value.strip().lower() not in ("", "nan", "none") else ""
+
+
+def rerank_passage(document: Optional[str], meta: Optional[dict]) -> str:
+    """
+    What the cross-encoder reads for a listing. The stored document is only the
+    embedded "Title Employment Type", so the passage is built from the metadata
+    instead: title, type and employer, location, then the Job Roles skills.
+    """
+    meta = meta or {}
+    title = " ".join(p for p in (_text(meta.get("Title")), _text(meta.get("Employment Type"))) if p)
+    employer = _text(meta.get("Employer"))
+    location = ", ".join(p for p in (_text(meta.get("Job Location")), _text(meta.get("Location Type"))) if p)
+    roles = _text(meta.get("Job Roles"))
+    parts = [
+        f"{title} at {employer}" if title and employer else title or employer,
+        f"Location: {location}" if location else "",
+        f"Roles: {roles}" if roles else "",
+    ]
+    passage = ". ".join(p for p in parts if p)
+    return (passage or document or "")[:MAX_PASSAGE_CHARS]
+
+
+def weighted_scores(query_text: str, results: dict) -> List[float]:
+    distances = results["distances"][0]
+    known = [similarity(d, 0.0) for d in distances if d is not None]
+    # lexical-only hits have no distance; score them like the weakest vector hit
+    fallback = min(known) if known else 0.0
+    query_terms = set(tokenize(query_text))
+    now = now_epoch()
+    return [
+        RANK_WEIGHT_SIMILARITY * similarity(distance, fallback)
+        + RANK_WEIGHT_ROLES * roles_overlap(query_terms, (meta or {}).get("Job Roles"))
+        + RANK_WEIGHT_RECENCY * recency((meta or {}).get("Expires"), now)
+        for distance, meta in zip(distances, results["metadatas"][0])
+    ]
+
+
+def reorder(results: dict, scores: List[float], n_results: int, mode: str) -> dict:
+    """Chroma's query result shape, sorted by `scores` (highest first) and cut to n_results."""
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:n_results]
+    out = {
+        key: [[results[key][0][i] for i in order]]
+        for key in ("ids", "documents", "metadatas", "distances")
+        if results.get(key) is not None
+    }
+    out["scores"] = [[round(float(scores[i]), 6) for i in order]]
+    out["rank_mode"] = mode
+    return out
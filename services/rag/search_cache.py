@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class SearchCache:
+    """
+    TTL + LRU cache of /search responses keyed by (normalized query, n_results, use_ai, filters, rank_mode).
+
+    `version` is bumped whenever ingest reports new listings; entries computed
+    against an older version are never stored, so a search that raced with an
+    ingest can't repopulate the cache with stale results.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(query: str, n_results: int, use_ai: bool, filters: Optional[dict] = None, rank_mode: str = "hybrid") -> tuple:
+        return (" ".join(query.lower().split()), int(n_results), bool(use_ai), json.dumps(filters or {}, sort_keys=True),
+                rank_mode)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, value: dict, version: int):
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> int:
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._entries.clear()
+            return self.version
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
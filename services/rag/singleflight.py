@@ -0,0 +1,112 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Hashable
+
+from instrumentation import counter
+
+COALESCED = counter("coalesced_requests_total", "Requests that joined an identical in-flight request", ("flight",))
+
+
+class _SharedStream:
+    """Items of one async iterator, pumped by a background task and replayed to every subscriber from the start."""
+
+    def __init__(self, source: AsyncIterator):
+        self.items = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one in-progress call.
+
+    do() runs a coroutine once per key and hands its result (or exception) to
+    every caller waiting on it; stream() does the same for an async iterator,
+    and each subscriber gets every item from the first one on, however late it
+    joined. Keys are only shared while the call is in flight; nothing is cached.
+    The shared call runs as its own task, so callers that go away don't cancel
+    it for the others; a stream is cancelled once its last subscriber leaves.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._streams = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _joined(self):
+        self.coalesced += 1
+        COALESCED.labels(self.name).inc()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(self._calls, key, t))
+        else:
+            self._joined()
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Hashable, source: Callable[[], AsyncIterator]) -> AsyncIterator:
+        shared = self._streams.get(key)
+        if shared is None:
+            self.calls += 1
+            shared = _SharedStream(source())
+            self._streams[key] = shared
+            shared.task.add_done_callback(lambda t: self._forget(self._streams, key, shared))
+        else:
+            self._joined()
+        shared.subscribers += 1
+        try:
+            async for item in shared.subscribe():
+                yield item
+        finally:
+            shared.subscribers -= 1
+            if not shared.subscribers and not shared.finished:
+                # nobody is listening any more (e.g. every client disconnected)
+                self._forget(self._streams, key, shared)
+                shared.task.cancel()
+
+    @staticmethod
+    def _forget(flights: dict, key: Hashable, flight):
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }